@@ -1,2 +1,7 @@
 from .core import BuildAgent
-__all__ = ["BuildAgent"]
\ No newline at end of file
+from .session import AgentSession, SessionManager
+from .batch import run_batch, load_checkpoint
+from .utils.agent_loop import AgentRun, RunBudget, StepRecord
+from .utils.context_manager import ContextManager, ContextStrategy, SlidingWindow, ToolOutputTruncation, ToolOutputSummarizer
+__all__ = ["BuildAgent", "AgentSession", "SessionManager", "run_batch", "load_checkpoint", "AgentRun", "RunBudget", "StepRecord",
+           "ContextManager", "ContextStrategy", "SlidingWindow", "ToolOutputTruncation", "ToolOutputSummarizer"]
\ No newline at end of file
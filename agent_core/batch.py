@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Union
+from llm_model.rate_limit import request_priority, PRIORITY_BATCH
+from .utils.logging_utils import pretty_print, pretty_error, LogType
+
+if TYPE_CHECKING:
+    from .core import BuildAgent
+
+
+def load_checkpoint(output_path: str) -> dict:
+    '''Read the records of a previous batch run: {item_id: record}; the last record of an id wins.
+    A line cut short by a crash is skipped.'''
+    records = {}
+    if not output_path or not os.path.exists(output_path):
+        return records
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and "id" in record:
+                records[str(record["id"])] = record
+    return records
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+async def _iterate(queries):
+    if hasattr(queries, "__aiter__"):
+        async for item in queries:
+            yield item
+    else:
+        for item in queries:
+            yield item
+
+
+def _normalise(index: int, item) -> tuple:
+    '''Items are query strings, identified by their position, or {"id", "query"} dicts with a stable id.'''
+    if isinstance(item, dict):
+        return str(item.get("id", index)), item["query"]
+    return str(index), item
+
+
+async def _run_item(agent: "BuildAgent", item_id: str, query: str) -> dict:
+    # Each item runs in its own task, so this only lowers the priority of this item's LLM requests
+    request_priority.set(PRIORITY_BATCH)
+    session = agent.new_session(session_id=item_id)
+    run = agent.new_run()
+    started = time.monotonic()
+    try:
+        result = await session.run_agent_async(query, run)
+    finally:
+        session.close()  # the session is not used again; don't leave its pins on the shared agent
+    return {
+        "id": item_id,
+        "query": query,
+        "status": run.status if run.status != "running" else "error",  # "running" = failed before the loop started
+        "result": result,
+        "steps": len(run.steps),
+        "tokens": run.tokens_used,
+        "duration": round(time.monotonic() - started, 3),
+    }
+
+
+async def run_batch(agent: "BuildAgent", queries: Union[Iterable, AsyncIterator], concurrency: int = 8, output_path: str = None,
+                    resume: bool = True, retry_failed: bool = True):
+    '''Run many independent queries on the agent and yield one record per query in completion order.
+
+    Every query gets its own session, so queries do not see each other's history. At most `concurrency`
+    queries run at once and the input is only read as slots free up, so generators of any size work.
+    With output_path every record is appended to that JSONL file as soon as it completes; with resume,
+    ids already recorded there are skipped (failed ones are run again when retry_failed).'''
+    done = {}
+    if output_path and resume:
+        done = {item_id: record for item_id, record in load_checkpoint(output_path).items()
+                if record.get("status") == "done" or not retry_failed}
+        if done:
+            pretty_print(LogType.AGENT_INFO, "Batch Resume", {"output": output_path, "skipped": len(done)})
+    out = open(output_path, "a" if resume else "w", encoding="utf-8") if output_path else None
+    if out is not None and out.tell() > 0 and not _ends_with_newline(output_path):
+        out.write("\n")  # close the line a crash cut short, so the next record starts on its own line
+    pending = set()
+    seen = set()
+    items = _iterate(queries)
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                item_id, query = _normalise(index, item)
+                index += 1
+                if item_id in done:
+                    continue
+                if item_id in seen:
+                    pretty_error("Batch Duplicate Id", f"Query id '{item_id}' appears more than once; the repeat is skipped.")
+                    continue
+                seen.add(item_id)
+                pending.add(asyncio.create_task(_run_item(agent, item_id, query)))
+            if not pending:
+                break
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                record = task.result()
+                if out is not None:
+                    out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    out.flush()
+                yield record
+    finally:
+        for task in pending:
+            task.cancel()
+        if out is not None:
+            out.close()
@@ -1,105 +1,197 @@
 from agent_tools import Tools
 import json
 from .utils.prompts import get_system_prompt, get_tools_info
-from .utils.tool_call import handle_tool_call, human_in_loop, get_tool_schema
+from .utils.tool_call import handle_tool_call, human_in_loop, get_tool_schema, select_tools
 from .utils.agent_response import AgentResponse
 from .utils.process_response import verify_response, handle_response_errors, inject_context_and_reinvoke
+from .utils.agent_loop import AgentRun, RunBudget, run_agent_loop
+from .utils.context_manager import ContextManager
 from .utils import *
-from .utils.logging_utils import pretty_print, pretty_error, LogType
+from .utils.logging_utils import pretty_print, pretty_error, flush_logs, LogType
 from .memory import AgentMemory
+from .session import AgentSession
+from .batch import run_batch
 from typing import List
-from agent_tools.mcp_method import MCPClient, MCPTool
+from agent_tools.mcp_method import MCPClient, MCPTool, get_mcp_registry
+from llm_model.http_pool import get_http_pool
 import asyncio
 class BuildAgent:
-    def __init__(self, name: str, description: str, llm_client, tools: Tools = None, mcp: MCPTool = None, enable_human_in_loop: bool = True, system_prompt: str = '', memory_collection_name: str = None):
+    def __init__(self, name: str, description: str, llm_client, tools: Tools = None, mcp: MCPTool = None, enable_human_in_loop: bool = True, system_prompt: str = '', memory_collection_name: str = None, max_steps: int = 50, max_run_seconds: float = None, max_run_tokens: int = None, context_manager: ContextManager = None, memory_write_behind: bool = False, memory_embedding_function=None, memory_namespace: str = None, memory_prefetch: bool = False, tool_top_k: int = None):
         self.name = name
         self.description = description
         self.llm_client = llm_client
         self.tools = tools if tools else Tools()
         self.mcp = mcp
-        self.consecutive_calls = 0
+        user_tool_names = set(self.tools._tools)
+        # Per-run budgets, enforced by the step loop in utils/agent_loop.py
+        self.max_steps = max_steps
+        self.max_run_seconds = max_run_seconds
+        self.max_run_tokens = max_run_tokens
+        # Optional history compaction applied before every LLM call (None = send the full history)
+        self.context_manager = context_manager
         # Configure the memory if enabled, and add the memory management functions as tools for the agent to use
+        self.memory = None
         if memory_collection_name:
-            AgentMemory(collection_name=memory_collection_name).register_memory_tools(self.tools)
+            self.memory = AgentMemory(collection_name=memory_collection_name, write_behind=memory_write_behind, embedding_function=memory_embedding_function, namespace=memory_namespace)
+            self.memory.register_memory_tools(self.tools)
+        # Look up relevant memories and learnings ourselves at the start of a run instead of spending two tool-call turns on it
+        self.memory_prefetch = memory_prefetch and self.memory is not None
         # Add human-in-loop tool if enabled
         if enable_human_in_loop:
             self.tools.add_tool(human_in_loop)
+        # With tool_top_k only the built-in tools go into the system prompt; the tools relevant to each query are added per run
+        self.tool_top_k = tool_top_k
+        self.pinned_tools = [name for name in self.tools._tools if name not in user_tool_names]
         # Build complete system message with tools information
-        tools_info = get_tools_info(self.tools)
-        system_content = f"{get_system_prompt(is_memory_enabled=memory_collection_name is not None, is_human_in_loop_enabled=enable_human_in_loop)}\n\n{tools_info}"
+        tools_info = get_tools_info(self.tools, names=self.pinned_tools if tool_top_k else None)
+        system_content = f"{get_system_prompt(is_memory_enabled=memory_collection_name is not None, is_human_in_loop_enabled=enable_human_in_loop, is_memory_prefetch_enabled=self.memory_prefetch, is_tool_search_enabled=bool(tool_top_k))}\n\n{tools_info}"
         self.messages = [{"role": "system", "content": system_content}]
-        if self.mcp:
-            self.messages.append({"role": "system", "content": f"New MCP tools added: {self.mcp.get_mcp_info()}. Update your knowledge base and tool access accordingly."})
+        if self.mcp and not tool_top_k:
+            self.messages.append({"role": "system", "content": f"New MCP tools added: {self.mcp.get_mcp_info(include_schema=True)}. Update your knowledge base and tool access accordingly."})
         if system_prompt:
             self.messages.append({"role": "system", "content": system_prompt})  # add this system prompt too
+        # The prompt every session starts from; `self.messages` is the agent's own default conversation
+        self.system_messages = tuple(self.messages)
+        self._loop = None  # created by the sync wrappers on first use
         
     async def process_response(self, response_text: str, max_tries: int = 5):
         """Processes the response from the LLM, checks if a tool call is needed, and triggers the appropriate function if necessary."""
-        # Extract JSON from response - handle cases where LLM adds extra text
-        processed_response = await verify_response(response_text)
-        if self.consecutive_calls > max_tries:
-            pretty_error("Max Retries Exceeded", f"Maximum consecutive tool call attempts ({max_tries}) exceeded.", {"last_response": response_text})
-            self.consecutive_calls = 0
-            return f"Error: Maximum consecutive tool call attempts ({max_tries}) exceeded. Last response: {response_text}"
-        
-        if type(processed_response) == str:  # if response processing returns a string, it means there was an error in processing (either JSON parsing or schema validation), so we handle the error and ask the LLM to correct it by injecting the error message into the conversation
-            self.consecutive_calls += 1
-            pretty_error("Response Parsing Failed", processed_response, {"raw_response": response_text})
-            new_response = await handle_response_errors(self, processed_response)
-            return await self.process_response(new_response)
-                    
-        if not processed_response.tool_call:
-            self.consecutive_calls = 0
-            pretty_print(LogType.LLM_RESPONSE, "Agent Response", {"text": processed_response.text, "task_complete": processed_response.task_complete})
-            
-            # If task is not complete and no tool was called, ask LLM to continue working
-            if not processed_response.task_complete:
-                pretty_print(LogType.AGENT_INFO, "Task Incomplete", {"message": "Task not complete, requesting LLM to continue"})
-                continue_prompt = "The task is not yet complete. Please continue working on it by calling the appropriate next tool."
-                self.messages.append({"role": "user", "content": continue_prompt})
-                new_response = await self.llm_client.invoke_model(messages=self.messages)
-                return await self.process_response(new_response)
-            
-            return processed_response.text
+        run = self.new_run()
+        run.budget.max_retries = max_tries
+        run.pending_response = response_text
+        return await run_agent_loop(self, run)
 
-        if processed_response.tool_call and self.consecutive_calls <= max_tries:
-            pretty_print(LogType.TOOL_CALL, processed_response.tool_name, {"arguments": processed_response.tool_args})
-            tool_output = await handle_tool_call(processed_response.tool_name, processed_response.tool_args, self.tools, self.mcp)
-            
-            # Check if tool execution succeeded or failed
-            self.messages.append({"role": "user", "content": f"Tool '{processed_response.tool_name}' executed with output: {tool_output}"})
-            new_response = await self.llm_client.invoke_model(messages=self.messages)
-            return await self.process_response(new_response)
-        else:
-            pretty_error("Max Consecutive Calls", f"Maximum consecutive tool call attempts ({max_tries}) exceeded.", {"last_response": str(processed_response)})
-            return f"Error: Maximum consecutive tool call attempts ({max_tries}) exceeded. Last error: {processed_response}"
-                
-    
-    async def run_agent_async(self, query: str):
+    async def run_agent_async(self, query: str, run: AgentRun = None, on_event=None):
+        """Runs the agent for the query. Pass an `AgentRun` to keep a handle for cancelling or resuming the run,
+        and an async `on_event(event: dict)` callback to receive streamed text and tool events."""
+        return await self._run_query(self, query, run, on_event)
+
+    async def _run_query(self, state, query: str, run: AgentRun = None, on_event=None):
+        """Runs a query against the message history of `state`: the agent itself or one of its sessions."""
         try:
-            self.messages.append({"role": "user", "content": query})
-            response = await self.llm_client.invoke_model(messages=self.messages)
-            
-            if not response:
-                pretty_error("LLM Response Empty", "Received empty response from LLM")
-                return "Error: Empty response from LLM."
-            
-            processed_response = await self.process_response(response)
-            
-            # process_response always returns a string or AgentResponse
-            if isinstance(processed_response, str):
-                return processed_response
-            
-            # If it's an AgentResponse, return its text
-            return processed_response.text if processed_response else "Error processing response from LLM."
+            if run is None:
+                run = self.new_run()
+            if self.memory_prefetch:
+                await self._inject_prefetched_memories(state.messages, query)
+            if self.tool_top_k:
+                self._inject_relevant_tools(state.messages, query)
+            state.messages.append({"role": "user", "content": query})
+            run.pending_response = None
+            return await run_agent_loop(state, run, on_event)
+        except Exception as e:
+            pretty_error("Critical Agent Error", str(e))
+            return f"Critical error: {str(e)}"
+
+    def new_run(self) -> AgentRun:
+        """A fresh run with this agent's default budget."""
+        return AgentRun(budget=RunBudget(max_steps=self.max_steps, max_seconds=self.max_run_seconds, max_tokens=self.max_run_tokens))
+
+    def new_session(self, session_id: str = None) -> AgentSession:
+        """Starts a separate conversation on this agent definition; see `AgentSession`."""
+        return AgentSession(self, session_id)
+
+    async def _inject_prefetched_memories(self, messages: List[dict], query: str):
+        """Adds the memories relevant to the query as a message, so the model does not have to request them."""
+        try:
+            memories = await self.memory.aprefetch(query)
+        except Exception as e:
+            pretty_error("Memory Prefetch Error", str(e))
+            return
+        # Per-request context goes after the system messages, which must stay the same for prompt caching
+        messages.append({"role": "user", "content": f"Retrieved memories for the next request: {json.dumps(memories)}"})
+
+    def _inject_relevant_tools(self, messages: List[dict], query: str):
+        """Adds the tools that best match the query as a message (tool_top_k mode)."""
+        relevant = select_tools(query, self.tools, self.mcp, self.tool_top_k, exclude=self.pinned_tools)
+        messages.append({"role": "user", "content": f"Relevant tools for the next request (name, description, arguments JSON schema): {relevant}. Use search_tools to find others."})
+
+    async def stream_agent_async(self, query: str, run: AgentRun = None):
+        """Runs the agent for the query and yields events as they happen:
+        {"type": "text", "delta"} while the answer streams, {"type": "tool_call"} / {"type": "tool_result"} per tool,
+        and finally {"type": "final", "text", "status"}."""
+        async for event in self._stream_query(self, query, run):
+            yield event
+
+    async def _stream_query(self, state, query: str, run: AgentRun = None):
+        if run is None:
+            run = self.new_run()
+        events = asyncio.Queue()
+        task = asyncio.create_task(self._run_query(state, query, run, on_event=events.put))
+        try:
+            while not task.done() or not events.empty():
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            yield {"type": "final", "text": await task, "status": run.status}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def resume_run(self, run: AgentRun, state=None):
+        """Continues a cancelled or budget-exhausted run from its last completed step."""
+        try:
+            return await run_agent_loop(state or self, run)
         except Exception as e:
             pretty_error("Critical Agent Error", str(e))
             return f"Critical error: {str(e)}"
     
     def run_agent_sync(self, query: str):  # we want to loop until tool call none
         try:
-            loop=asyncio.get_event_loop()
-            return loop.run_until_complete(self.run_agent_async(query))
+            return self._sync_loop().run_until_complete(self.run_agent_async(query))
         except Exception as e:
             pretty_error("Critical Agent Error", str(e))
-            return f"Critical error: {str(e)}"
\ No newline at end of file
+            return f"Critical error: {str(e)}"
+        finally:
+            flush_logs()
+
+    def run_batch(self, queries, concurrency: int = 8, output_path: str = None, resume: bool = True, retry_failed: bool = True):
+        """Async generator running many independent queries with bounded concurrency; see `agent_core.batch.run_batch`."""
+        return run_batch(self, queries, concurrency, output_path, resume, retry_failed)
+
+    def run_batch_sync(self, queries, concurrency: int = 8, output_path: str = None, resume: bool = True, retry_failed: bool = True, on_result=None) -> list:
+        """Runs a batch to the end on the agent's event loop and returns the records in completion order.
+        `on_result(record)` is called as each query finishes."""
+        async def collect():
+            records = []
+            async for record in self.run_batch(queries, concurrency, output_path, resume, retry_failed):
+                records.append(record)
+                if on_result is not None:
+                    on_result(record)
+            return records
+        try:
+            return self._sync_loop().run_until_complete(collect())
+        finally:
+            flush_logs()
+
+    async def aclose(self):
+        """Close the pooled HTTP clients and stop the MCP servers bound to the running event loop
+        (they are shared, so other agents on this loop lose them too and restart them on their next call)."""
+        await get_http_pool().aclose()
+        await ((self.mcp.registry if self.mcp is not None else None) or get_mcp_registry()).stop_loop_servers()
+
+    def close(self):
+        """Shut down the event loop of the sync wrappers and what was opened on it; a later sync call starts a new one."""
+        loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.run_until_complete(self.aclose())
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            loop.close()
+            flush_logs()
+
+    def _sync_loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop the sync wrappers run on, reused across calls so MCP sessions and clients bound to it stay valid."""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from chromadb.api.types import EmbeddingFunction, Documents, Embeddings
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+
+class LocalEmbedder(EmbeddingFunction[Documents]):
+    def __init__(self, embedding_function: EmbeddingFunction = None, batch_size: int = 32, max_workers: int = 2):
+        '''Batched local CPU embedder. Splits the input into batches of batch_size and embeds them in a
+        worker pool; defaults to Chroma's bundled ONNX MiniLM model, so vectors match the default collection setup.'''
+        self.embedding_function = embedding_function or DefaultEmbeddingFunction()
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rawagent-embedder")
+
+    def __call__(self, input: Documents) -> Embeddings:
+        batches = [input[i:i + self.batch_size] for i in range(0, len(input), self.batch_size)]
+        if len(batches) <= 1:
+            return list(self.embedding_function(input)) if input else []
+        return [vector for batch in self._executor.map(self.embedding_function, batches) for vector in batch]
+
+    async def aembed(self, input: Documents) -> Embeddings:
+        '''Embed from async code without blocking the event loop.'''
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.__call__, input)
+
+    # Chroma stores the embedding function's identity with the collection, so report the wrapped one
+    def name(self) -> str:
+        return self.embedding_function.name()
+
+    def get_config(self):
+        return self.embedding_function.get_config()
+
+    def build_from_config(self, config):
+        return type(self.embedding_function).build_from_config(config)
+
+    def default_space(self):
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self):
+        return self.embedding_function.supported_spaces()
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(self, embedding_function: EmbeddingFunction = None, cache_path: str = "./chroma_db/embedding_cache.db", max_memory_entries: int = 10000):
+        '''Content-hash keyed embedding cache: an in-memory LRU in front of a SQLite store.
+        Only texts that were never embedded before reach the wrapped embedding function, in one batch.'''
+        self.embedding_function = embedding_function or DefaultEmbeddingFunction()
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.embedding_function.name()}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: list):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _embed(self, input: Documents, embed) -> Embeddings:
+        keys = [self._key(text) for text in input]
+        vectors = [None] * len(input)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[i] = self._memory[key]
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing and self._db is not None:
+                placeholders = ",".join("?" * len(missing))
+                rows = dict(self._db.execute(f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", [keys[i] for i in missing]).fetchall())
+                for i in missing:
+                    if keys[i] in rows:
+                        vectors[i] = array("f", rows[keys[i]]).tolist()
+                        self._remember(keys[i], vectors[i])
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self.hits += len(input) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Duplicate texts inside one call are embedded once
+            unique = list(dict.fromkeys(input[i] for i in missing))
+            embedded = dict(zip(unique, (list(map(float, vector)) for vector in embed(unique))))
+            with self._lock:
+                for i in missing:
+                    vectors[i] = embedded[input[i]]
+                    self._remember(keys[i], vectors[i])
+                if self._db is not None:
+                    self._db.executemany("INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                                         [(keys[i], array("f", vectors[i]).tobytes()) for i in missing])
+                    self._db.commit()
+        return vectors
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._embed(input, self.embedding_function)
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        return self._embed(input, self.embedding_function.embed_query)
+
+    def name(self) -> str:
+        return self.embedding_function.name()
+
+    def get_config(self):
+        return self.embedding_function.get_config()
+
+    def build_from_config(self, config):
+        return type(self.embedding_function).build_from_config(config)
+
+    def default_space(self):
+        return self.embedding_function.default_space()
+
+    def supported_spaces(self):
+        return self.embedding_function.supported_spaces()
@@ -1,39 +1,347 @@
+import asyncio
+import atexit
+import functools
+import os
+import threading
+import time
 import chromadb
 import uuid
+import warnings
 from agent_tools import Tools
+from .embeddings import CachedEmbeddingFunction
 from .utils.logging_utils import pretty_print, pretty_error, LogType
 
+class MemoryWriteQueue:
+    def __init__(self, flush_size: int = 32, flush_interval: float = 2.0, max_retries: int = 3):
+        '''Write-behind buffer for memory inserts. Memories from any number of agents are grouped per
+        collection and written with one `collection.add` (one embedding batch) when flush_size memories
+        are pending or every flush_interval seconds, from a background thread. Pending writes are
+        flushed on interpreter shutdown. A batch whose write fails is queued again, up to max_retries
+        times; after that it is dropped and recorded in `failed`.'''
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.failed = []  # {"collection", "ids", "error"} of batches dropped after max_retries
+        self._pending = {}  # id(collection): [collection, ids, documents, metadatas, failed_attempts]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="rawagent-memory-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self._close_at_exit)
+
+    def put(self, collection, ids: list, documents: list, metadatas: list):
+        with self._lock:
+            entry = self._pending.setdefault(id(collection), [collection, [], [], [], 0])
+            entry[1].extend(ids)
+            entry[2].extend(documents)
+            entry[3].extend(metadatas)
+            size = len(entry[1])
+        if size >= self.flush_size:
+            self._wake.set()
+
+    def pending_count(self, collection=None) -> int:
+        with self._lock:
+            if collection is not None:
+                entry = self._pending.get(id(collection))
+                return len(entry[1]) if entry else 0
+            return sum(len(entry[1]) for entry in self._pending.values())
+
+    def flush(self, collection=None):
+        '''Write pending memories now, for one collection or for all of them.
+        Raises RuntimeError if a batch could not be written (it stays queued until max_retries is reached).'''
+        errors = self._flush(collection)
+        if errors:
+            raise RuntimeError(f"Failed to write queued memories: {'; '.join(errors)}")
+
+    def close(self):
+        '''Stop the background writer and write everything still pending, retrying failed batches.'''
+        self._closed = True
+        self._wake.set()
+        errors = []
+        while self.pending_count():
+            errors.extend(self._flush())  # every failure counts an attempt, so this ends
+        if errors:
+            raise RuntimeError(f"Failed to write queued memories: {'; '.join(errors)}")
+
+    def _close_at_exit(self):
+        try:
+            self.close()
+        except RuntimeError:
+            pass  # already reported through pretty_error
+
+    def _flush(self, collection=None) -> list:
+        with self._flush_lock:
+            with self._lock:
+                if collection is not None:
+                    entry = self._pending.pop(id(collection), None)
+                    batches = [entry] if entry else []
+                else:
+                    batches, self._pending = list(self._pending.values()), {}
+            errors = []
+            for target, ids, documents, metadatas, attempts in batches:
+                try:
+                    target.add(ids=ids, documents=documents, metadatas=metadatas)
+                    pretty_print(LogType.MEMORY_SAVE, "Memories Flushed", {"collection": target.name, "count": len(ids)})
+                except Exception as e:
+                    errors.append(f"{target.name}: {e}")
+                    if attempts + 1 > self.max_retries:
+                        self.failed.append({"collection": target.name, "ids": ids, "error": str(e)})
+                        pretty_error("Memory Flush Error", f"{e} (dropped after {attempts + 1} attempts)", {"collection": target.name, "count": len(ids)})
+                        continue
+                    pretty_error("Memory Flush Error", f"{e} (will retry)", {"collection": target.name, "count": len(ids)})
+                    with self._lock:
+                        # Keep insertion order: the failed batch goes before anything queued meanwhile
+                        newer = self._pending.get(id(target))
+                        self._pending[id(target)] = [target, ids + newer[1], documents + newer[2], metadatas + newer[3], attempts + 1] if newer else [target, ids, documents, metadatas, attempts + 1]
+            return errors
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+
+
+_write_queue = None
+
+def get_memory_write_queue() -> MemoryWriteQueue:
+    '''Process-wide write-behind queue shared by every AgentMemory with write_behind enabled.'''
+    global _write_queue
+    if _write_queue is None:
+        _write_queue = MemoryWriteQueue()
+    return _write_queue
+
+
+def _same_embedding_function(a, b) -> bool:
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    # Two instances of one class are the same model unless their chroma config says otherwise
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            config_a, config_b = a.get_config(), b.get_config()
+    except Exception:
+        return True
+    return config_a is NotImplemented or config_b is NotImplemented or config_a == config_b
+
+
+class MemoryService:
+    def __init__(self, path: str = "./chroma_db", client=None, embedding_cache=True):
+        '''One Chroma client (and one embedding cache) shared by every AgentMemory that uses this service.
+        Collections are opened once and reused, so creating an agent does not open the store again.
+        client overrides the PersistentClient at path (e.g. chromadb.HttpClient or EphemeralClient).'''
+        self.path = path
+        self._client = client
+        self.embedding_cache = embedding_cache
+        self._collections = {}
+        self._embedding_functions = {}
+        self._collection_embedding_functions = {}  # name: embedding function the collection was opened with
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    def _wrap_embedding_function(self, embedding_function, embedding_cache):
+        if not embedding_cache:
+            return embedding_function
+        # One cache per underlying function, so agents sharing a model share its cached vectors
+        key = (id(embedding_function), embedding_cache)
+        if key not in self._embedding_functions:
+            cache_path = embedding_cache if isinstance(embedding_cache, str) else (os.path.join(self.path, "embedding_cache.db") if self.path else None)
+            self._embedding_functions[key] = CachedEmbeddingFunction(embedding_function, cache_path=cache_path)
+        return self._embedding_functions[key]
+
+    def get_collection(self, name: str, embedding_function=None, embedding_cache=None):
+        '''Open (once) and return the named collection.
+        Raises ValueError if it is already open with a different embedding function.'''
+        with self._lock:
+            collection = self._collections.get(name)
+        if collection is None:
+            client = self.client
+            with self._lock:
+                if name not in self._collections:
+                    wrapped = self._wrap_embedding_function(embedding_function, self.embedding_cache if embedding_cache is None else embedding_cache)
+                    if wrapped is not None:
+                        self._collections[name] = client.get_or_create_collection(name=name, embedding_function=wrapped)
+                    else:
+                        self._collections[name] = client.get_or_create_collection(name=name)
+                    self._collection_embedding_functions[name] = embedding_function
+                    return self._collections[name]
+                collection = self._collections[name]
+        opened_with = self._collection_embedding_functions.get(name)
+        # Vectors from another model would land in (and be searched against) the same index
+        if embedding_function is not None and not _same_embedding_function(opened_with, embedding_function):
+            current = type(opened_with).__name__ if opened_with is not None else "the default"
+            raise ValueError(f"Collection '{name}' is already open with embedding function {current}, "
+                             f"not {type(embedding_function).__name__}; use another collection name for a different embedding model.")
+        return collection
+
+
+_memory_services = {}
+_default_memory_path = "./chroma_db"
+
+def get_memory_service(path: str = None) -> MemoryService:
+    '''Process-wide MemoryService for a storage path (default: the configured default path).'''
+    path = path or _default_memory_path
+    if path not in _memory_services:
+        _memory_services[path] = MemoryService(path=path)
+    return _memory_services[path]
+
+def configure_memory_service(path: str = "./chroma_db", client=None, embedding_cache=True) -> MemoryService:
+    '''Set up the process-wide MemoryService for path and make it the default for new AgentMemory/BuildAgent
+    instances, e.g. to move the store or point agents at a server-backed client.'''
+    global _default_memory_path
+    _memory_services[path] = MemoryService(path=path, client=client, embedding_cache=embedding_cache)
+    _default_memory_path = path
+    return _memory_services[path]
+
+
+# Neighbours fetched per memory when looking for a duplicate; expired ones are skipped
+_DEDUP_CANDIDATES = 5
+
+
 class AgentMemory:
-    def __init__(self, collection_name="rawagent_memory"):
-        '''Initialize the semantic memory for the agent.'''
-        self._client = chromadb.PersistentClient(path="./chroma_db")
-        self.collection = self._client.get_or_create_collection(name=collection_name)
+    def __init__(self, collection_name="rawagent_memory", write_behind: bool = False, write_queue: MemoryWriteQueue = None, embedding_function=None, embedding_cache=None, namespace: str = None, service: MemoryService = None, path: str = None, dedup_threshold: float = None, ttl: dict = None, max_memories: int = None):
+        '''Initialize the semantic memory for the agent.
+        Storage comes from a MemoryService (the process-wide one for `path`, or the default one, unless service is given), so
+        any number of AgentMemory objects share one Chroma client and open each collection once.
+        With namespace set, memories are tagged with it and every read, search and delete is restricted
+        to it, so many tenants/agents can share one collection in isolation.
+        With write_behind=True inserts are queued and embedded/written in batches by a MemoryWriteQueue
+        (the shared one unless write_queue is given); reads flush this collection's pending writes first.
+        embedding_function is any Chroma embedding function (default: Chroma's local MiniLM model, see LocalEmbedder).
+        embedding_cache wraps it in a CachedEmbeddingFunction so unchanged texts and repeated queries are not
+        re-embedded: True stores the cache next to the database, a string is the cache file, False disables it
+        (default: the service's setting, which is True).
+        dedup_threshold: a new memory whose vector distance to an existing memory of the same type is at most
+        this value is not stored again; the existing one is refreshed and its ID returned (None disables it).
+        ttl: seconds to keep memories of each type, e.g. {"user_preference": 90 * 86400}; expired memories
+        are hidden from reads and deleted by compact(). max_memories bounds the store on compact().'''
+        self.dedup_threshold = dedup_threshold
+        self.ttl = ttl or {}
+        self.max_memories = max_memories
+        self.service = service or get_memory_service(path)
+        self.namespace = namespace
+        self.collection = self.service.get_collection(collection_name, embedding_function=embedding_function, embedding_cache=embedding_cache)
+        self.write_queue = (write_queue or get_memory_write_queue()) if write_behind else None
+
+    def _flush_pending(self):
+        # A failed write is logged and stays queued; reads go ahead with what is stored
+        if self.write_queue is not None and self.write_queue.pending_count(self.collection):
+            self.write_queue._flush(self.collection)
         
     def add_memory(self, content: str, metadata: dict = None) -> str:
         '''Add a new memory to the agent's semantic storage. Returns the memory ID.'''
-        id = str(uuid.uuid4())
-        if metadata is None:
-            metadata = {}
-        
-        self.collection.add(
-            documents=[content], 
-            metadatas=[{**metadata, "id": id, "type": metadata.get("type", "general")}],
-            ids=[id]
-        )
-        pretty_print(LogType.MEMORY_SAVE, "Memory Saved", {
-            "id": id, 
-            "content": content[:100] + "..." if len(content) > 100 else content,
-            "metadata": metadata
-        })
-        return id
-
-    def get_memory(self, intent: str = None, id: str = None, memory_type: str = None):
-        '''Retrieve a memory from the agent's semantic storage by intent, ID, or type.'''
+        return self.add_memories([{"content": content, "metadata": metadata}])[0]
+
+    def add_memories(self, memories: list[dict]) -> list[str]:
+        '''Add several memories at once, each {"content": "...", "metadata": {...}}, embedded and written as one batch. Returns the memory IDs.'''
+        now = time.time()
+        contents = [memory["content"] for memory in memories]
+        types = [(memory.get("metadata") or {}).get("type", "general") for memory in memories]
+        duplicates = self._find_duplicates(contents, types) if self.dedup_threshold is not None else [None] * len(memories)
+        result, ids, documents, metadatas = [], [], [], []
+        batch = {}  # (type, content): id, so repeats inside one call are stored once too
+        for memory, memory_type, duplicate in zip(memories, types, duplicates):
+            content = memory["content"]
+            metadata = memory.get("metadata") or {}
+            if duplicate is not None:
+                self._refresh(duplicate, memory_type, now)
+            else:
+                # A repeat inside this call: that memory is not stored yet and is written below with fresh metadata
+                duplicate = batch.get((memory_type, content))
+            if duplicate is not None:
+                result.append(duplicate)
+                pretty_print(LogType.MEMORY_SAVE, "Memory Deduplicated", {"id": duplicate, "content": content[:100] + "..." if len(content) > 100 else content})
+                continue
+            id = str(uuid.uuid4())
+            batch[(memory_type, content)] = id
+            result.append(id)
+            ids.append(id)
+            documents.append(content)
+            metadatas.append({**metadata, "id": id, "type": memory_type, "created_at": now})
+            if memory_type in self.ttl:
+                metadatas[-1]["expires_at"] = now + self.ttl[memory_type]
+            if self.namespace is not None:
+                metadatas[-1]["namespace"] = self.namespace
+            pretty_print(LogType.MEMORY_SAVE, "Memory Saved" if self.write_queue is None else "Memory Queued", {
+                "id": id, 
+                "content": content[:100] + "..." if len(content) > 100 else content,
+                "metadata": metadata
+            })
+        if ids:
+            if self.write_queue is not None:
+                self.write_queue.put(self.collection, ids, documents, metadatas)
+            else:
+                self.collection.add(documents=documents, metadatas=metadatas, ids=ids)
+        return result
+
+    def _find_duplicates(self, contents: list, types: list) -> list:
+        '''ID of an existing memory within dedup_threshold of each content (same type and namespace), or None.
+        One query per memory type; only stored memories are compared, not ones still queued for write-behind.
+        A few neighbours are fetched, so an expired closest match doesn't hide a live one just behind it.'''
+        duplicates = [None] * len(contents)
+        now = time.time()
+        for memory_type in set(types):
+            indexes = [i for i, t in enumerate(types) if t == memory_type]
+            results = self.collection.query(query_texts=[contents[i] for i in indexes], n_results=_DEDUP_CANDIDATES,
+                                            where=self._build_where(memory_type, namespace=self.namespace), include=["metadatas", "distances"])
+            for i, ids, distances, metadatas in zip(indexes, results["ids"], results["distances"], results["metadatas"]):
+                # Nearest first: the first live neighbour is the match, if it is close enough
+                match = next(((id, distance) for id, distance, metadata in zip(ids, distances, metadatas) if self._is_live(metadata, now)), None)
+                if match is not None and match[1] <= self.dedup_threshold:
+                    duplicates[i] = match[0]
+        return duplicates
+
+    def _refresh(self, id: str, memory_type: str, now: float):
+        '''Mark a deduplicated memory as seen again, restarting its TTL.'''
+        metadata = {"last_seen_at": now}
+        if memory_type in self.ttl:
+            metadata["expires_at"] = now + self.ttl[memory_type]
+        self.collection.update(ids=[id], metadatas=[metadata])
+
+    @staticmethod
+    def _is_live(metadata: dict, now: float = None) -> bool:
+        expires_at = (metadata or {}).get("expires_at")
+        return expires_at is None or expires_at > (now or time.time())
+
+    def flush(self):
+        '''Write any queued memories for this collection now.'''
+        if self.write_queue is not None:
+            self.write_queue.flush(self.collection)
+
+    @staticmethod
+    def _build_where(memory_type: str = None, metadata_filter: dict = None, namespace: str = None):
+        '''Combine the namespace, type and metadata filters into a single Chroma `where` clause (None when there is nothing to filter on).'''
+        conditions = [{"namespace": namespace}] if namespace is not None else []
+        if memory_type is not None:
+            conditions.append({"type": memory_type})
+        for key, value in (metadata_filter or {}).items():
+            conditions.append({key: value})  # plain values mean equality, {"$in": [...]} etc. pass through
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def get_memory(self, intent: str = None, id: str = None, memory_type: str = None, metadata_filter: dict = None, limit: int = None, offset: int = 0):
+        '''Retrieve a memory from the agent's semantic storage by intent, ID, type or metadata.
+        intent runs a semantic search (top `limit`, default 5) and can be combined with memory_type / metadata_filter;
+        without intent, memory_type / metadata_filter return matching memories page by page (`limit` default 20, `offset`).'''
         try:
+            self._flush_pending()
+            where = self._build_where(memory_type, metadata_filter, self.namespace)
             if id is not None:
-                # Direct retrieval by ID
-                result = self.collection.get(ids=[id])
-                if result and result['documents'] and len(result['documents']) > 0:
+                # Direct retrieval by ID (within this namespace)
+                result = self.collection.get(ids=[id], where=self._build_where(namespace=self.namespace))
+                if result and result['documents'] and len(result['documents']) > 0 and self._is_live(result['metadatas'][0] if result['metadatas'] else None):
                     pretty_print(LogType.MEMORY_RETRIEVE, f"Memory Retrieved (by ID)", {
                         "id": id,
                         "content": result['documents'][0],
@@ -43,46 +351,19 @@ class AgentMemory:
                 pretty_error("Memory Not Found", f"No memory found with ID: {id}")
                 return f"Memory not found with ID: {id}"
             
-            elif memory_type is not None:
-                # Step 1: Get ALL memories to debug
-                all_memories = self.collection.get()
-                
-                # Step 2: Manual filter - look for matching type
-                matching = []
-                if all_memories and all_memories['metadatas']:
-                    for i, meta in enumerate(all_memories['metadatas']):
-                        if isinstance(meta, dict):
-                            # Check exact match
-                            if meta.get("type") == memory_type:
-                                matching.append({
-                                    "id": all_memories['ids'][i],
-                                    "content": all_memories['documents'][i],
-                                    "metadata": meta
-                                })
-                            # Debug: log what we're comparing
-                            pretty_print(LogType.MEMORY_RETRIEVE, f"Checking metadata", {
-                                "stored_type": meta.get("type"),
-                                "searching_for": memory_type,
-                                "match": meta.get("type") == memory_type
-                            })
-                
-                if matching:
-                    pretty_print(LogType.MEMORY_RETRIEVE, f"Memory Retrieved (by type: {memory_type})", {
-                        "results": len(matching),
-                        "memories": matching
-                    })
-                    return matching
-                
-                pretty_error("Memory Not Found", f"No memories found with type: {memory_type}. Checked {len(all_memories['metadatas']) if all_memories and all_memories['metadatas'] else 0} memories.")
-                return f"No memories found with type: {memory_type}"
-            
             elif intent is not None:
-                # Semantic search with query_texts
-                results = self.collection.query(query_texts=[intent], n_results=5)
+                # Semantic search, optionally restricted by metadata (filtered inside Chroma, not in Python)
+                results = self.collection.query(query_texts=[intent], n_results=limit or 5, where=where)
+                if results and results['documents'] and results['documents'][0] and results['metadatas']:
+                    live = [i for i, metadata in enumerate(results['metadatas'][0]) if self._is_live(metadata)]
+                    for key in ('ids', 'documents', 'metadatas', 'distances'):
+                        if results.get(key):
+                            results[key][0] = [results[key][0][i] for i in live]
                 
                 if results and results['documents'] and len(results['documents']) > 0 and results['documents'][0]:
                     pretty_print(LogType.MEMORY_RETRIEVE, f"Memory Retrieved (semantic search)", {
                         "intent": intent,
+                        "filter": where,
                         "matches_found": len(results['documents'][0]),
                         "top_result": results['documents'][0][0] if results['documents'][0] else None
                     })
@@ -95,8 +376,27 @@ class AgentMemory:
                 pretty_error("Memory Not Found", f"No matching memories found for intent: {intent}")
                 return f"No memories found matching: {intent}"
             
+            elif memory_type is not None or metadata_filter:
+                # Metadata lookup pushed down to Chroma as a `where` filter, one page at a time
+                result = self.collection.get(where=where, limit=limit or 20, offset=offset or None)
+                matching = [
+                    {"id": result['ids'][i], "content": doc, "metadata": result['metadatas'][i] if result['metadatas'] else {}}
+                    for i, doc in enumerate(result['documents'] or [])
+                    if self._is_live(result['metadatas'][i] if result['metadatas'] else None)
+                ]
+                if matching:
+                    pretty_print(LogType.MEMORY_RETRIEVE, f"Memory Retrieved (by filter: {where})", {
+                        "results": len(matching),
+                        "offset": offset,
+                        "memories": matching
+                    })
+                    return matching
+                
+                pretty_error("Memory Not Found", f"No memories found with filter: {where} (offset {offset}).")
+                return f"No memories found with type: {memory_type}" if memory_type and not metadata_filter else f"No memories found with filter: {where}"
+            
             else:
-                return "Either 'id', 'memory_type', or 'intent' must be provided to retrieve memory."
+                return "Either 'id', 'memory_type', 'metadata_filter', or 'intent' must be provided to retrieve memory."
         except Exception as e:
             pretty_error("Memory Retrieval Error", str(e))
             return f"Error retrieving memory: {e}"
@@ -104,22 +404,26 @@ class AgentMemory:
     def delete_memory(self, id: str):
         '''Delete a memory from the agent's semantic storage by its ID.'''
         try:
-            self.collection.delete(ids=[id])
+            self._flush_pending()
+            self.collection.delete(ids=[id], where=self._build_where(namespace=self.namespace))
             pretty_print(LogType.MEMORY_SAVE, "Memory Deleted", {"id": id})
             return f"Memory {id} deleted successfully."
         except Exception as e:
             pretty_error("Memory Deletion Error", str(e))
             return f"Error deleting memory: {e}"
     
-    def list_all_memories(self):
-        '''List all memories currently stored. Useful for debugging.'''
+    def list_all_memories(self, limit: int = None, offset: int = None):
+        '''List memories currently stored, optionally one page at a time. Useful for debugging.'''
         try:
-            all_docs = self.collection.get()
+            self._flush_pending()
+            all_docs = self.collection.get(where=self._build_where(namespace=self.namespace), limit=limit, offset=offset)
             if not all_docs or not all_docs['documents']:
                 return "No memories stored yet."
             
             memories = []
             for i, doc in enumerate(all_docs['documents']):
+                if not self._is_live(all_docs['metadatas'][i] if all_docs['metadatas'] and i < len(all_docs['metadatas']) else None):
+                    continue
                 memories.append({
                     "id": all_docs['ids'][i],
                     "content": doc,
@@ -135,11 +439,128 @@ class AgentMemory:
             pretty_error("Memory List Error", str(e))
             return f"Error listing memories: {e}"
         
+    def compact(self, merge_threshold: float = None, page_size: int = 256) -> dict:
+        '''Keep the store bounded: delete expired memories, merge near-duplicates (within merge_threshold,
+        default dedup_threshold, of a memory of the same type; the newest one is kept) and, with max_memories set,
+        evict the least recently seen memories above the limit. Returns how many memories each step removed.'''
+        self._flush_pending()
+        now = time.time()
+        namespace_where = self._build_where(namespace=self.namespace)
+        stats = {"expired": 0, "merged": 0, "evicted": 0}
+
+        expired_where = {"expires_at": {"$lte": now}}
+        expired = self.collection.get(where={"$and": [namespace_where, expired_where]} if namespace_where else expired_where, include=[])["ids"]
+        self._delete_ids(expired)
+        stats["expired"] = len(expired)
+
+        threshold = merge_threshold if merge_threshold is not None else self.dedup_threshold
+        if threshold is not None:
+            removed = set()
+            offset = 0
+            while True:
+                # Deletes are deferred to the end so the pages stay stable
+                page = self.collection.get(where=namespace_where, limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+                if not page["ids"]:
+                    break
+                offset += len(page["ids"])
+                by_type = {}
+                for i, metadata in enumerate(page["metadatas"]):
+                    if page["ids"][i] not in removed:
+                        by_type.setdefault((metadata or {}).get("type", "general"), []).append(i)
+                for memory_type, indexes in by_type.items():
+                    results = self.collection.query(query_embeddings=[page["embeddings"][i] for i in indexes], n_results=5,
+                                                    where=self._build_where(memory_type, namespace=self.namespace), include=["metadatas", "distances"])
+                    for i, ids, distances, metadatas in zip(indexes, results["ids"], results["distances"], results["metadatas"]):
+                        id = page["ids"][i]
+                        created_at = (page["metadatas"][i] or {}).get("created_at", 0)
+                        for other, distance, other_metadata in zip(ids, distances, metadatas):
+                            if id in removed:
+                                break
+                            if other == id or other in removed or distance > threshold:
+                                continue
+                            removed.add(id if (other_metadata or {}).get("created_at", 0) >= created_at else other)
+            self._delete_ids(list(removed))
+            stats["merged"] = len(removed)
+
+        if self.max_memories is not None:
+            everything = self.collection.get(where=namespace_where, include=["metadatas"])
+            if len(everything["ids"]) > self.max_memories:
+                last_seen = lambda i: max((everything["metadatas"][i] or {}).get("last_seen_at", 0), (everything["metadatas"][i] or {}).get("created_at", 0))
+                oldest = sorted(range(len(everything["ids"])), key=last_seen)[:len(everything["ids"]) - self.max_memories]
+                self._delete_ids([everything["ids"][i] for i in oldest])
+                stats["evicted"] = len(oldest)
+
+        pretty_print(LogType.MEMORY_SAVE, "Memory Compacted", {"collection": self.collection.name, "namespace": self.namespace, **stats})
+        return stats
+
+    def _delete_ids(self, ids: list, batch_size: int = 1000):
+        for start in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[start:start + batch_size])
+
+    def start_compaction(self, interval: float = 3600.0, merge_threshold: float = None) -> "MemoryCompactionJob":
+        '''Run compact() every interval seconds on a background thread.'''
+        return MemoryCompactionJob(self, interval=interval, merge_threshold=merge_threshold)
+
+    # Async variants: the Chroma calls (and embedding) run in the default executor instead of on the event loop
+    async def _run_in_executor(self, method, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    async def aadd_memory(self, content: str, metadata: dict = None) -> str:
+        return await self._run_in_executor(self.add_memory, content, metadata)
+
+    async def aadd_memories(self, memories: list[dict]) -> list[str]:
+        return await self._run_in_executor(self.add_memories, memories)
+
+    async def aget_memory(self, intent: str = None, id: str = None, memory_type: str = None, metadata_filter: dict = None, limit: int = None, offset: int = 0):
+        return await self._run_in_executor(self.get_memory, intent, id, memory_type, metadata_filter, limit, offset)
+
+    async def adelete_memory(self, id: str):
+        return await self._run_in_executor(self.delete_memory, id)
+
+    async def alist_all_memories(self, limit: int = None, offset: int = None):
+        return await self._run_in_executor(self.list_all_memories, limit, offset)
+
+    async def aprefetch(self, intent: str, limit: int = 5) -> dict:
+        '''Run the two lookups the memory workflow starts every task with - semantic context for the
+        request and the most relevant learnings - concurrently. Returns {"context": [...], "learnings": [...]}.'''
+        context, learnings = await asyncio.gather(
+            self.aget_memory(intent=intent, limit=limit),
+            self.aget_memory(intent=intent, memory_type="learning", limit=limit),
+        )
+        return {
+            "context": context["documents"] if isinstance(context, dict) else [],
+            "learnings": learnings["documents"] if isinstance(learnings, dict) else [],
+        }
+
     def register_memory_tools(self, tools: Tools):
         '''Register the memory management functions as tools for the agent.'''
         tools.add_tool(self.add_memory)
+        tools.add_tool(self.add_memories)
         tools.add_tool(self.get_memory)
         tools.add_tool(self.delete_memory)
-        
-    
 
+
+class MemoryCompactionJob:
+    def __init__(self, memory: AgentMemory, interval: float = 3600.0, merge_threshold: float = None):
+        '''Background thread calling memory.compact() every interval seconds until stop().'''
+        self.memory = memory
+        self.interval = interval
+        self.merge_threshold = merge_threshold
+        self.last_stats = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rawagent-memory-compaction", daemon=True)
+        self._thread.start()
+
+    def run_once(self) -> dict:
+        try:
+            self.last_stats = self.memory.compact(merge_threshold=self.merge_threshold)
+        except Exception as e:
+            pretty_error("Memory Compaction Error", str(e), {"collection": self.memory.collection.name})
+        return self.last_stats
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,220 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, List
+from .utils.agent_loop import AgentRun
+from .utils.logging_utils import pretty_print, LogType
+
+if TYPE_CHECKING:
+    from .core import BuildAgent
+
+
+class AgentSession:
+    def __init__(self, agent: "BuildAgent", session_id: str = None, messages: List[dict] = None):
+        '''One conversation on a shared BuildAgent definition.
+
+        The agent holds what is the same for every user (system prompt, tools, MCP, memory, LLM client);
+        the session only holds its message history, so creating one costs a copy of the system messages.'''
+        self.agent = agent
+        self.session_id = session_id or uuid.uuid4().hex
+        self.messages = messages if messages is not None else [dict(message) for message in agent.system_messages]
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.last_run: AgentRun = None
+
+    # The step loop reads these from whatever it runs on
+    @property
+    def llm_client(self):
+        return self.agent.llm_client
+
+    @property
+    def tools(self):
+        return self.agent.tools
+
+    @property
+    def mcp(self):
+        return self.agent.mcp
+
+    @property
+    def context_manager(self):
+        return self.agent.context_manager
+
+    async def run_agent_async(self, query: str, run: AgentRun = None, on_event=None) -> str:
+        self.last_active = time.monotonic()
+        self.last_run = run or self.agent.new_run()
+        try:
+            return await self.agent._run_query(self, query, self.last_run, on_event)
+        finally:
+            self.last_active = time.monotonic()
+
+    async def stream_agent_async(self, query: str, run: AgentRun = None):
+        self.last_active = time.monotonic()
+        self.last_run = run or self.agent.new_run()
+        try:
+            async for event in self.agent._stream_query(self, query, self.last_run):
+                yield event
+        finally:
+            self.last_active = time.monotonic()
+
+    async def resume_run(self, run: AgentRun = None) -> str:
+        '''Continues the given run, or the session's last one, from its last completed step.'''
+        self.last_active = time.monotonic()
+        return await self.agent.resume_run(run or self.last_run, state=self)
+
+    def reset(self):
+        '''Forget the conversation, keeping the system messages.'''
+        self.close()
+        self.messages[:] = [dict(message) for message in self.agent.system_messages]
+
+    def close(self):
+        '''Release what the session holds on the shared agent: the pins of its messages.'''
+        if self.agent.context_manager:
+            self.agent.context_manager.unpin_all(self.messages)
+
+
+class _SessionSlot:
+    __slots__ = ("session", "active", "waiters")
+
+    def __init__(self, session: AgentSession):
+        self.session = session
+        self.active = 0
+        self.waiters = deque()
+
+
+class SessionManager:
+    def __init__(self, agent: "BuildAgent", max_concurrent_runs: int = 64, max_runs_per_session: int = 1, max_queued_per_session: int = None,
+                 max_sessions: int = None, idle_timeout: float = None):
+        '''Runs many conversations on one agent definition inside one event loop.
+
+        At most max_concurrent_runs runs execute at once and at most max_runs_per_session per session
+        (keep 1 unless runs of a session may interleave in its history). Waiting requests are granted
+        round-robin across sessions, so one busy session cannot starve the others. Sessions idle for
+        idle_timeout seconds, or the least recently used idle ones beyond max_sessions, are dropped.'''
+        self.agent = agent
+        self.max_concurrent_runs = max_concurrent_runs
+        self.max_runs_per_session = max_runs_per_session
+        self.max_queued_per_session = max_queued_per_session
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._slots = OrderedDict()  # session_id: _SessionSlot, least recently used first
+        self._ready = deque()  # session ids with waiting requests, in round-robin order
+        self._active = 0
+
+    def get_session(self, session_id: str = None) -> AgentSession:
+        '''Return the session, creating it if needed.'''
+        slot = self._slots.get(session_id) if session_id is not None else None
+        if slot is None:
+            self.evict_idle()
+            slot = _SessionSlot(self.agent.new_session(session_id))
+            self._slots[slot.session.session_id] = slot
+        self._slots.move_to_end(slot.session.session_id)
+        return slot.session
+
+    def close_session(self, session_id: str) -> bool:
+        slot = self._slots.get(session_id)
+        if slot is None or slot.active or slot.waiters:
+            return False
+        del self._slots[session_id]
+        slot.session.close()
+        return True
+
+    def evict_idle(self) -> int:
+        '''Drop idle sessions past idle_timeout or beyond max_sessions; returns how many were dropped.'''
+        now = time.monotonic()
+        evicted = 0
+        for session_id, slot in list(self._slots.items()):
+            over_limit = self.max_sessions is not None and len(self._slots) >= self.max_sessions
+            expired = self.idle_timeout is not None and now - slot.session.last_active > self.idle_timeout
+            if not (over_limit or expired):
+                break  # ordered by last use, the rest are more recent
+            if slot.active or slot.waiters:
+                continue
+            del self._slots[session_id]
+            slot.session.close()
+            evicted += 1
+        if evicted:
+            pretty_print(LogType.AGENT_INFO, "Sessions Evicted", {"evicted": evicted, "sessions": len(self._slots)})
+        return evicted
+
+    async def run(self, session_id: str, query: str, run: AgentRun = None, on_event=None) -> str:
+        '''Run a query in the session once it gets a run slot.'''
+        session = self.get_session(session_id)
+        slot = self._slots[session.session_id]
+        await self._acquire(slot)
+        try:
+            return await session.run_agent_async(query, run, on_event)
+        finally:
+            self._release(slot)
+
+    async def stream(self, session_id: str, query: str, run: AgentRun = None):
+        session = self.get_session(session_id)
+        slot = self._slots[session.session_id]
+        await self._acquire(slot)
+        try:
+            async for event in session.stream_agent_async(query, run):
+                yield event
+        finally:
+            self._release(slot)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._slots),
+            "active_runs": self._active,
+            "queued_runs": sum(len(slot.waiters) for slot in self._slots.values()),
+        }
+
+    def _can_start(self, slot: _SessionSlot) -> bool:
+        return self._active < self.max_concurrent_runs and slot.active < self.max_runs_per_session
+
+    async def _acquire(self, slot: _SessionSlot):
+        # Only skip the queue when nobody is waiting, otherwise go through the round-robin
+        if not self._ready and not slot.waiters and self._can_start(slot):
+            self._active += 1
+            slot.active += 1
+            return
+        if self.max_queued_per_session is not None and len(slot.waiters) >= self.max_queued_per_session:
+            raise RuntimeError(f"Session '{slot.session.session_id}' already has {len(slot.waiters)} queued requests.")
+        waiter = asyncio.get_running_loop().create_future()
+        slot.waiters.append(waiter)
+        if len(slot.waiters) == 1:
+            self._ready.append(slot.session.session_id)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(slot)  # granted just before the cancel arrived
+            elif waiter in slot.waiters:
+                slot.waiters.remove(waiter)
+            raise
+
+    def _release(self, slot: _SessionSlot):
+        self._active -= 1
+        slot.active -= 1
+        slot.session.last_active = time.monotonic()
+        self._dispatch()
+
+    def _dispatch(self):
+        '''Grant free run slots to waiting requests, one session at a time in round-robin order.'''
+        skipped = 0
+        while self._ready and self._active < self.max_concurrent_runs and skipped < len(self._ready):
+            session_id = self._ready.popleft()
+            slot = self._slots.get(session_id)
+            if slot is None or not slot.waiters:
+                continue
+            if slot.active >= self.max_runs_per_session:
+                self._ready.append(session_id)
+                skipped += 1
+                continue
+            waiter = slot.waiters.popleft()
+            if waiter.done():  # cancelled while waiting
+                if slot.waiters:
+                    self._ready.appendleft(session_id)
+                continue
+            waiter.set_result(None)
+            self._active += 1
+            slot.active += 1
+            skipped = 0
+            if slot.waiters:
+                self._ready.append(session_id)
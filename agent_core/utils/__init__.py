@@ -1,9 +1,15 @@
 from .prompts import *
-from .process_response import clean_response, validate_response_schema, verify_response, handle_response_errors, inject_context_and_reinvoke
-from .tool_call import handle_tool_call, make_tool_call, get_tool_schema
-from .agent_response import AgentResponse
-from .logging_utils import pretty_print, pretty_error, section_header, LogType, Colors
+from .process_response import clean_response, repair_json, validate_response_schema, verify_response, handle_response_errors, inject_context_and_reinvoke
+from .tool_call import handle_tool_call, handle_tool_calls, make_tool_call, get_tool_schema, search_tools, select_tools
+from .agent_response import AgentResponse, ToolCall
+from .agent_loop import AgentRun, RunBudget, StepRecord, run_agent_loop
+from .stream_parser import StreamingResponseParser
+from .context_manager import ContextManager, ContextStrategy, SlidingWindow, ToolOutputTruncation, ToolOutputSummarizer, estimate_tokens
+from .logging_utils import pretty_print, pretty_error, section_header, LogType, LogLevel, Colors, configure_logging, flush_logs, ConsoleSink, JsonLinesSink
 
 __all__=['get_system_prompt','get_tools_info','get_mcp_tools_info',
-         'clean_response','validate_response_schema','handle_tool_call','make_tool_call','get_tool_schema','verify_response','handle_response_errors','AgentResponse','inject_context_and_reinvoke',
-         'pretty_print','pretty_error','section_header','LogType','Colors']
\ No newline at end of file
+         'clean_response','repair_json','validate_response_schema','handle_tool_call','handle_tool_calls','make_tool_call','get_tool_schema','search_tools','select_tools','verify_response','handle_response_errors','AgentResponse','ToolCall','inject_context_and_reinvoke',
+         'AgentRun','RunBudget','StepRecord','run_agent_loop','StreamingResponseParser',
+         'ContextManager','ContextStrategy','SlidingWindow','ToolOutputTruncation','ToolOutputSummarizer','estimate_tokens',
+         'pretty_print','pretty_error','section_header','LogType','LogLevel','Colors',
+         'configure_logging','flush_logs','ConsoleSink','JsonLinesSink']
\ No newline at end of file
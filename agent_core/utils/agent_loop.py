@@ -0,0 +1,229 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional, List, Callable, Awaitable
+from .process_response import verify_response, handle_response_errors
+from .tool_call import handle_tool_call, handle_tool_calls
+from .stream_parser import StreamingResponseParser
+from .context_manager import estimate_tokens
+from .logging_utils import pretty_error, pretty_print, LogType, LogLevel
+from llm_model.router import step_kind
+from llm_model.structured import response_schema
+from .agent_response import AgentResponse
+
+if TYPE_CHECKING:
+    from ..core import BuildAgent
+
+CONTINUE_PROMPT = "The task is not yet complete. Please continue working on it by calling the appropriate next tool."
+
+# Given to clients with structured_output=True, so they constrain the reply to an AgentResponse
+AGENT_RESPONSE_SCHEMA = AgentResponse.model_json_schema()
+
+
+@dataclass(slots=True)
+class RunBudget:
+    '''Limits for a single agent run. None disables the deadline / token limit.'''
+    max_steps: int = 50
+    max_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+    max_retries: int = 5  # consecutive unparseable responses before giving up
+
+
+@dataclass(slots=True)
+class StepRecord:
+    '''Compact record of one loop step: what was done, which tool, and what it cost.'''
+    index: int
+    action: str  # tool_call | parse_retry | continue | final
+    tool_name: Optional[str] = None
+    tokens: int = 0
+    duration: float = 0.0
+
+
+@dataclass(slots=True)
+class AgentRun:
+    '''State of one agent run. Holding on to it lets a caller cancel the run or resume it later.'''
+    budget: RunBudget = field(default_factory=RunBudget)
+    pending_response: Optional[str] = None  # next LLM output to process, None = the LLM must be (re)invoked
+    status: str = "running"  # running | done | cancelled | budget_exceeded | error
+    result: Optional[str] = None
+    retries: int = 0
+    tokens_used: int = 0
+    steps: List[StepRecord] = field(default_factory=list)
+    cancel_requested: bool = False
+    early_tool_tasks: list = field(default_factory=list)  # ((tool_name, tool_args), task) started while the response was streaming
+
+    def cancel(self):
+        '''Ask the loop to stop at the next step boundary.'''
+        self.cancel_requested = True
+
+    def _finish(self, status: str, result: str) -> str:
+        self.status = status
+        self.result = result
+        return result
+
+
+async def _invoke(agent: "BuildAgent", run: AgentRun, emit: Optional[Callable[[dict], Awaitable]] = None, step: str = "query") -> str:
+    # Lets a ModelRouter send cheap steps to a cheaper model; reset afterwards so the kind doesn't leak to the caller
+    step_token = step_kind.set(step)
+    try:
+        if agent.context_manager:
+            await agent.context_manager.compact(agent.messages)
+        cache_stats = getattr(agent.llm_client, "cache_stats", None)
+        calls_before = cache_stats.calls if cache_stats is not None else 0
+        if emit is not None and hasattr(agent.llm_client, "stream_model"):
+            response = await _stream(agent, run, emit)
+        else:
+            response = await agent.llm_client.invoke_model(messages=agent.messages)
+    finally:
+        step_kind.reset(step_token)
+    run.tokens_used += estimate_tokens(agent.messages) + estimate_tokens(response)
+    if cache_stats is not None and cache_stats.calls > calls_before:
+        pretty_print(LogType.LLM_RESPONSE, "Prompt Cache", {**cache_stats.last, "hits": cache_stats.hits, "misses": cache_stats.misses}, level=LogLevel.DEBUG)
+    return response
+
+
+async def _stream(agent: "BuildAgent", run: AgentRun, emit: Callable[[dict], Awaitable]) -> str:
+    '''Stream the LLM output: pass `text` through as it arrives and start tool calls as soon as they are fully parsed.
+
+    Only local tools registered with early_dispatch=True start early: the response is not validated yet, and a
+    tool already running in a thread or process can't be interrupted if the final response drops the call.'''
+    parser = StreamingResponseParser()
+    chunks = []
+    dispatched = False
+    async for chunk in agent.llm_client.stream_model(agent.messages):
+        chunks.append(chunk)
+        delta = parser.feed(chunk)
+        if delta:
+            await emit({"type": "text", "delta": delta})
+        if not dispatched:
+            tool_calls = parser.ready_tool_calls()
+            if tool_calls:
+                dispatched = True
+                for tool_name, tool_args in tool_calls:
+                    if agent.tools is None or not agent.tools.allows_early_dispatch(tool_name):
+                        continue  # started once the full response has been validated
+                    run.early_tool_tasks.append(((tool_name, tool_args), asyncio.create_task(handle_tool_call(tool_name, tool_args, agent.tools, agent.mcp))))
+    return "".join(chunks)
+
+
+def _cancel_early_tools(run: AgentRun):
+    for _, task in run.early_tool_tasks:
+        task.cancel()
+    run.early_tool_tasks = []
+
+
+async def _dispatch_tool_calls(agent: "BuildAgent", run: AgentRun, tool_calls: list) -> list:
+    '''Run the tool calls, reusing any that were already started while the response was streaming.'''
+    if not run.early_tool_tasks:
+        return await handle_tool_calls(tool_calls, agent.tools, agent.mcp)
+    early, run.early_tool_tasks = run.early_tool_tasks, []
+    pending = []
+    for tool_name, tool_args in tool_calls:
+        match = next((i for i, (call, _) in enumerate(early) if call == (tool_name, tool_args)), None)
+        pending.append(early.pop(match)[1] if match is not None else handle_tool_call(tool_name, tool_args, agent.tools, agent.mcp))
+    for _, task in early:  # started early but not part of the final response
+        task.cancel()
+    return await asyncio.gather(*pending)
+
+
+async def run_agent_loop(agent: "BuildAgent", run: AgentRun, emit: Optional[Callable[[dict], Awaitable]] = None) -> str:
+    '''Drive the agent step by step until it answers, fails, is cancelled or runs out of budget.
+
+    Each step consumes `run.pending_response`, performs one action (tool call, parse retry or
+    "continue" nudge) and stores the next LLM output back on the run, so the loop keeps a flat
+    stack and can be resumed from the run object after a cancel or an exhausted budget.
+
+    With `emit`, events are sent as they happen: {"type": "text", "delta"} while a streaming
+    client produces the `text` field, {"type": "tool_call"} and {"type": "tool_result"} per tool.'''
+    budget = run.budget
+    deadline = time.monotonic() + budget.max_seconds if budget.max_seconds is not None else None
+    run.status = "running"
+    run.cancel_requested = False
+    schema = response_schema.set(AGENT_RESPONSE_SCHEMA)
+    try:
+        while True:
+            if run.cancel_requested:
+                pretty_print(LogType.AGENT_INFO, "Run Cancelled", {"steps": len(run.steps)})
+                return run._finish("cancelled", "Error: Agent run cancelled.")
+            if len(run.steps) >= budget.max_steps:
+                pretty_error("Step Budget Exceeded", f"Agent run exceeded {budget.max_steps} steps.")
+                return run._finish("budget_exceeded", f"Error: Maximum number of steps ({budget.max_steps}) exceeded.")
+            if deadline is not None and time.monotonic() > deadline:
+                pretty_error("Deadline Exceeded", f"Agent run exceeded {budget.max_seconds} seconds.")
+                return run._finish("budget_exceeded", f"Error: Agent run exceeded its deadline of {budget.max_seconds} seconds.")
+            if budget.max_tokens is not None and run.tokens_used >= budget.max_tokens:
+                pretty_error("Token Budget Exceeded", f"Agent run used ~{run.tokens_used} of {budget.max_tokens} tokens.")
+                return run._finish("budget_exceeded", f"Error: Token budget ({budget.max_tokens}) exceeded.")
+
+            if run.pending_response is None:
+                run.pending_response = await _invoke(agent, run, emit)
+            response_text = run.pending_response
+            if not response_text:
+                pretty_error("LLM Response Empty", "Received empty response from LLM")
+                return run._finish("error", "Error: Empty response from LLM.")
+
+            started = time.monotonic()
+            tokens_before = run.tokens_used
+            processed_response = await verify_response(response_text)
+            if run.retries > budget.max_retries:
+                pretty_error("Max Retries Exceeded", f"Maximum consecutive tool call attempts ({budget.max_retries}) exceeded.", {"last_response": response_text})
+                run.retries = 0
+                return run._finish("error", f"Error: Maximum consecutive tool call attempts ({budget.max_retries}) exceeded. Last response: {response_text}")
+
+            if type(processed_response) == str or not processed_response.tool_call:
+                _cancel_early_tools(run)
+
+            if type(processed_response) == str:  # parsing or schema validation failed, ask the LLM to correct itself
+                run.retries += 1
+                pretty_error("Response Parsing Failed", processed_response, {"raw_response": response_text})
+                run.pending_response = None
+                action, tool_name = "parse_retry", None
+                step_token = step_kind.set("parse_retry")
+                try:
+                    new_response = await handle_response_errors(agent, processed_response)
+                finally:
+                    step_kind.reset(step_token)
+                run.tokens_used += estimate_tokens(agent.messages) + estimate_tokens(new_response)
+
+            elif not processed_response.tool_call:
+                run.retries = 0
+                pretty_print(LogType.LLM_RESPONSE, "Agent Response", {"text": processed_response.text, "task_complete": processed_response.task_complete})
+                if processed_response.task_complete:
+                    run.steps.append(StepRecord(len(run.steps), "final", duration=time.monotonic() - started))
+                    run.pending_response = None
+                    return run._finish("done", processed_response.text)
+                # If task is not complete and no tool was called, ask LLM to continue working
+                pretty_print(LogType.AGENT_INFO, "Task Incomplete", {"message": "Task not complete, requesting LLM to continue"})
+                agent.messages.append({"role": "user", "content": CONTINUE_PROMPT})
+                run.pending_response = None
+                action, tool_name = "continue", None
+                new_response = await _invoke(agent, run, emit, "continue")
+
+            else:
+                tool_calls = [(call.tool_name, call.tool_args) for call in processed_response.get_tool_calls()] or [(processed_response.tool_name, processed_response.tool_args)]
+                for call_name, call_args in tool_calls:
+                    pretty_print(LogType.TOOL_CALL, call_name, {"arguments": call_args})
+                    if emit is not None:
+                        await emit({"type": "tool_call", "tool_name": call_name, "tool_args": call_args})
+                # Independent calls run concurrently and their results go back to the LLM in one message
+                tool_outputs = await _dispatch_tool_calls(agent, run, tool_calls)
+                if emit is not None:
+                    for (call_name, _), tool_output in zip(tool_calls, tool_outputs):
+                        await emit({"type": "tool_result", "tool_name": call_name, "output": tool_output})
+                agent.messages.append({"role": "user", "content": "\n".join(
+                    f"Tool '{call_name}' executed with output: {tool_output}" for (call_name, _), tool_output in zip(tool_calls, tool_outputs)
+                )})
+                tool_name = ",".join(str(call_name) for call_name, _ in tool_calls)
+                run.pending_response = None
+                action = "tool_call"
+                new_response = await _invoke(agent, run, emit, "tool_result")
+
+            run.pending_response = new_response
+            run.steps.append(StepRecord(len(run.steps), action, tool_name, run.tokens_used - tokens_before, time.monotonic() - started))
+    except asyncio.CancelledError:
+        run.status = "cancelled"
+        raise
+    finally:
+        # Tool calls started for a response this run will no longer act on (cancel, budget, error)
+        _cancel_early_tools(run)
+        response_schema.reset(schema)
@@ -1,5 +1,10 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+class ToolCall(BaseModel):
+    '''A single tool invocation inside a multi-tool response.'''
+    tool_name: str = Field(description="Name of the tool to call (must match available tools exactly)")
+    tool_args: Dict[str, Any] = Field(default_factory=dict, description="Arguments dictionary for the tool call")
 
 class AgentResponse(BaseModel):
     '''Defines the structure of the agent's response.'''
@@ -23,6 +28,10 @@ class AgentResponse(BaseModel):
         default=None,
         description="Arguments dictionary for the tool call"
     )
+    tool_calls: Optional[List[ToolCall]] = Field(
+        default=None,
+        description="Optional: several independent tool calls to run in parallel, each {tool_name, tool_args}. Use instead of tool_name/tool_args"
+    )
     task_complete: bool = Field(
         default=False,
         description="true when task fully completed, false while working"
@@ -48,6 +57,14 @@ class AgentResponse(BaseModel):
         description="Error message if something went wrong, null otherwise"
     )
     
+    def get_tool_calls(self) -> List[ToolCall]:
+        '''All tool calls requested in this response, whether given as tool_calls or as a single tool_name/tool_args.'''
+        if self.tool_calls:
+            return self.tool_calls
+        if self.tool_name:
+            return [ToolCall(tool_name=self.tool_name, tool_args=self.tool_args or {})]
+        return []
+    
     class Config:
         json_schema_extra = {
             "example": {
@@ -56,6 +73,7 @@ class AgentResponse(BaseModel):
                 "tool_call": True,
                 "tool_name": "web_search",
                 "tool_args": {"url": "https://example.com"},
+                "tool_calls": None,
                 "task_complete": False,
                 "last_called_tool": None,
                 "current_task": "Executing web search",
@@ -0,0 +1,132 @@
+from typing import List
+from .logging_utils import pretty_print, pretty_error, LogType
+from llm_model.router import step_kind
+from llm_model.structured import response_schema
+
+TOOL_OUTPUT_PREFIX = "Tool '"  # every tool result message starts with "Tool '<name>' executed with output: ..."
+
+
+def estimate_tokens(content) -> int:
+    '''Cheap token estimate (~4 characters per token) for a string or a list of messages.'''
+    if isinstance(content, list):
+        return sum(len(str(msg.get("content", ""))) for msg in content) // 4
+    return len(content or "") // 4
+
+
+def is_tool_output(message: dict) -> bool:
+    return message.get("role") == "user" and str(message.get("content", "")).startswith(TOOL_OUTPUT_PREFIX)
+
+
+class ContextStrategy:
+    '''Base class for a context compaction step. Receives the message list and returns the list to keep.'''
+    async def apply(self, messages: List[dict], manager: "ContextManager") -> List[dict]:
+        return messages
+
+
+class SlidingWindow(ContextStrategy):
+    def __init__(self, max_tokens: int = 8000):
+        '''Keep the leading system prompts, pinned messages and as many of the most recent messages as fit in max_tokens.'''
+        self.max_tokens = max_tokens
+
+    async def apply(self, messages, manager):
+        head = 0
+        while head < len(messages) and messages[head].get("role") == "system":
+            head += 1
+        system, rest = messages[:head], messages[head:]
+        budget = self.max_tokens - estimate_tokens(system) - estimate_tokens([m for m in rest if manager.is_pinned(m)])
+        keep = set()
+        for i in range(len(rest) - 1, -1, -1):
+            if manager.is_pinned(rest[i]):
+                continue
+            cost = estimate_tokens([rest[i]])
+            if cost > budget and keep:  # the latest message is always kept
+                break
+            budget -= cost
+            keep.add(i)
+        kept = system + [m for i, m in enumerate(rest) if i in keep or manager.is_pinned(m)]
+        if len(kept) < len(messages):
+            pretty_print(LogType.AGENT_INFO, "Context Window", {"dropped_messages": len(messages) - len(kept), "max_tokens": self.max_tokens})
+        return kept
+
+
+class ToolOutputTruncation(ContextStrategy):
+    def __init__(self, max_chars: int = 4000):
+        '''Cut tool outputs longer than max_chars down to their head and tail.'''
+        self.max_chars = max_chars
+
+    async def apply(self, messages, manager):
+        for msg in messages:
+            content = str(msg.get("content", ""))
+            if is_tool_output(msg) and len(content) > self.max_chars and not manager.is_pinned(msg):
+                half = self.max_chars // 2
+                msg["content"] = f"{content[:half]}\n...[truncated {len(content) - self.max_chars} characters]...\n{content[-half:]}"
+        return messages
+
+
+class ToolOutputSummarizer(ContextStrategy):
+    def __init__(self, llm_client, max_chars: int = 4000):
+        '''Replace tool outputs longer than max_chars with a summary written by llm_client (any `invoke_model` client, ideally a cheap one).'''
+        self.llm_client = llm_client
+        self.max_chars = max_chars
+
+    async def apply(self, messages, manager):
+        for msg in messages:
+            content = str(msg.get("content", ""))
+            if not is_tool_output(msg) or len(content) <= self.max_chars or manager.is_pinned(msg):
+                continue
+            step = step_kind.set("summary")
+            schema = response_schema.set(None)  # the summary is plain text, not an AgentResponse
+            try:
+                summary = await self.llm_client.invoke_model(messages=[
+                    {"role": "system", "content": "Summarise the following tool output for an AI agent. Keep every fact, number, id, url and error message it needs to continue its task. Reply with the summary only."},
+                    {"role": "user", "content": content},
+                ])
+            except Exception as e:
+                pretty_error("Tool Output Summary Failed", str(e))
+                continue
+            finally:
+                step_kind.reset(step)
+                response_schema.reset(schema)
+            # Keep the "Tool '<name>' executed with output:" header so the message is still recognisable
+            header = content.split(":", 1)[0]
+            msg["content"] = f"{header}: [summarised] {summary}"
+        return messages
+
+
+class ContextManager:
+    def __init__(self, strategies: List[ContextStrategy] = None):
+        '''Compacts an agent's message history before every LLM call by running the strategies in order.
+
+        Compaction happens in place, so `BuildAgent.messages` itself stays bounded instead of only the prompt.'''
+        self.strategies = strategies if strategies is not None else [ToolOutputTruncation(), SlidingWindow()]
+        self._pinned = {}  # id(message): message; holding the dict keeps its id from being reused
+
+    def pin(self, message: dict) -> dict:
+        '''Never drop or shorten this message (the exact dict object held in the message list).'''
+        self._pinned[id(message)] = message
+        return message
+
+    def unpin(self, message: dict):
+        self._pinned.pop(id(message), None)
+
+    def unpin_all(self, messages: List[dict]):
+        '''Forget the pins of every message in the list, e.g. the history of a closed session.'''
+        for message in messages:
+            self._pinned.pop(id(message), None)
+
+    def is_pinned(self, message: dict) -> bool:
+        return id(message) in self._pinned
+
+    async def compact(self, messages: List[dict]) -> List[dict]:
+        '''Compact the list in place and return it.'''
+        before = list(messages) if self._pinned else None
+        compacted = messages
+        for strategy in self.strategies:
+            compacted = await strategy.apply(compacted, self)
+        if compacted is not messages:
+            messages[:] = compacted
+        # Forget pins for messages this compaction dropped; pins in other sessions' histories stay
+        if before is not None:
+            kept = {id(m) for m in messages}
+            self.unpin_all([m for m in before if id(m) not in kept])
+        return messages
@@ -1,6 +1,12 @@
 #Pretty logging utilities for agent formatting
+import atexit
 import json
-from enum import Enum
+import random
+import sys
+import threading
+import time
+from collections import deque
+from enum import Enum, IntEnum
 from typing import Any
 
 
@@ -30,6 +36,13 @@ class LogType(Enum):
     AGENT_INFO       = "▶ AGENT INFO"
 
 
+class LogLevel(IntEnum):
+    DEBUG   = 10
+    INFO    = 20
+    WARNING = 30
+    ERROR   = 40
+
+
 _COLOR_MAP = {
     LogType.TOOL_CALL:       Colors.BLUE,
     LogType.TOOL_RESPONSE:   Colors.GREEN,
@@ -43,50 +56,222 @@ _COLOR_MAP = {
     LogType.HUMAN_IN_LOOP:   Colors.YELLOW,
 }
 
+_ERROR_TYPES = {LogType.TOOL_ERROR, LogType.LLM_ERROR, LogType.PARSING_ERROR}
 
-def pretty_print(log_type: LogType, title: str = "", content: Any = None, is_error: bool = False):
-    color = _COLOR_MAP.get(log_type, Colors.YELLOW)
 
-    heading = f"{color}{Colors.BOLD}{log_type.value}"
-    if title:
-        heading += f" - {title}"
-    heading += Colors.RESET
+def _format_content(content: Any, indent=2) -> str:
+    if isinstance(content, dict):
+        try:
+            return json.dumps(content, indent=indent)
+        except Exception:
+            return str(content)
+    return str(content)
 
-    print(heading)
 
-    if content is not None:
-        if isinstance(content, dict):
-            try:
-                formatted = json.dumps(content, indent=2)
-            except Exception:
-                formatted = str(content)
+class ConsoleSink:
+    '''Coloured, human readable output on stdout.'''
+    def write(self, record: dict):
+        kind = record["kind"]
+        if kind == "header":
+            emoji, title = record["content"], record["title"]
+            lines = [f"\n{Colors.BOLD}{Colors.CYAN}{emoji * 40}{Colors.RESET}",
+                     f"{Colors.BOLD}{Colors.CYAN}{title}{Colors.RESET}",
+                     f"{Colors.BOLD}{Colors.CYAN}{emoji * 40}{Colors.RESET}\n"]
+        elif kind == "error":
+            lines = [f"{Colors.RED}{Colors.BOLD} ERROR - {record['title']}{Colors.RESET}"]
+            if record["message"]:
+                lines.append(f"{Colors.RED}{record['message']}{Colors.RESET}")
+            if record["content"]:
+                lines.append(f"{Colors.DIM}{_format_content(record['content'])}{Colors.RESET}")
         else:
-            formatted = str(content)
-        print(f"{Colors.DIM}{formatted}{Colors.RESET}")
+            log_type = record["log_type"]
+            heading = f"{_COLOR_MAP.get(log_type, Colors.YELLOW)}{Colors.BOLD}{log_type.value}"
+            if record["title"]:
+                heading += f" - {record['title']}"
+            lines = [heading + Colors.RESET]
+            if record["content"] is not None:
+                lines.append(f"{Colors.DIM}{_format_content(record['content'])}{Colors.RESET}")
+        sys.stdout.write("\n".join(lines) + "\n")
 
+    def flush(self):
+        sys.stdout.flush()
 
-def pretty_error(title: str, error_msg: str, context: Any = None):
-    print(f"{Colors.RED}{Colors.BOLD} ERROR - {title}{Colors.RESET}")
+    def close(self):
+        self.flush()  # stdout is not ours to close
+
+
+class JsonLinesSink:
+    '''One compact JSON object per record, appended to a file.'''
+    def __init__(self, path: str = "rawagent_log.jsonl"):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict):
+        log_type = record["log_type"]
+        self._file.write(json.dumps({
+            "ts": record["ts"],
+            "level": record["level"].name,
+            "kind": record["kind"],
+            "type": log_type.name if log_type else None,
+            "title": record["title"],
+            "message": record["message"],
+            "content": record["content"],
+        }, default=str, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class LogBackend:
+    def __init__(self, level: LogLevel = LogLevel.INFO, sinks: list = None, sample_rate: float = 1.0,
+                 buffered: bool = True, flush_interval: float = 0.2, max_buffer: int = 1000):
+        '''Routes log records to sinks. With buffered=True records are queued and written by a background
+        thread, so formatting and stdout/file I/O never run on the event loop. Records below `level`,
+        dropped by sampling (errors are never sampled out) or with no sink configured cost nothing.
+        If the writer falls behind, at most max_buffer records are kept and the oldest are dropped.
+        A buffered record owns its content until it is written: callers pass a payload built for that record
+        and don't change it afterwards, so nothing is copied or serialised on the caller's thread.'''
+        self.level = LogLevel(level)
+        self.sinks = sinks if sinks is not None else [ConsoleSink()]
+        self.sample_rate = sample_rate
+        self.buffered = buffered
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = deque(maxlen=max_buffer)
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        if buffered and self.sinks:
+            self._thread = threading.Thread(target=self._run, name="rawagent-log-flusher", daemon=True)
+            self._thread.start()
+
+    def enabled(self, level: LogLevel) -> bool:
+        if not self.sinks or level < self.level:
+            return False
+        return level >= LogLevel.ERROR or self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def emit(self, record: dict):
+        if not self.buffered:
+            self._write([record])
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1  # the deque drops the oldest record
+            self._wake.set()
+        self._buffer.append(record)
+
+    def flush(self):
+        '''Write out everything buffered so far (blocking the caller).'''
+        records = []
+        with self._lock:
+            while self._buffer:
+                records.append(self._buffer.popleft())
+            self._write(records)
 
-    if error_msg:
-        print(f"{Colors.RED}{error_msg}{Colors.RESET}")
+    def close(self, keep_sinks: list = ()):
+        '''Write what is buffered, stop the writer thread and close the sinks (except those in keep_sinks).'''
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+        for sink in self.sinks:
+            if any(sink is kept for kept in keep_sinks):
+                continue
+            try:
+                if hasattr(sink, "close"):
+                    sink.close()
+                else:
+                    sink.flush()
+            except Exception:
+                pass
 
-    if context:
-        if isinstance(context, dict):
+    def _write(self, records: list):
+        if not records:
+            return
+        for sink in self.sinks:
+            for record in records:
+                try:
+                    sink.write(record)
+                except Exception:
+                    pass
             try:
-                formatted = json.dumps(context, indent=2)
+                sink.flush()
             except Exception:
-                formatted = str(context)
+                pass
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+_backend = LogBackend()
+atexit.register(lambda: _backend.close())
+
+
+def configure_logging(level: str = "info", sink="console", json_path: str = "rawagent_log.jsonl",
+                      sample_rate: float = 1.0, buffered: bool = True, flush_interval: float = 0.2) -> LogBackend:
+    '''Replace the log backend.
+
+    :param level: "debug", "info", "warning" or "error".
+    :param sink: "console", "json", "none", or a list of those / sink objects.
+    :param json_path: File used by the "json" sink.
+    :param sample_rate: Fraction of non-error records kept (1.0 = all).
+    :param buffered: Write records from a background thread instead of the caller.
+    '''
+    global _backend
+    sinks = []
+    for item in (sink if isinstance(sink, (list, tuple)) else [sink]):
+        if item == "console":
+            sinks.append(ConsoleSink())
+        elif item == "json":
+            sinks.append(JsonLinesSink(json_path))
+        elif item in ("none", None):
+            continue
         else:
-            formatted = str(context)
-        print(f"{Colors.DIM}{formatted}{Colors.RESET}")
+            sinks.append(item)
+    _backend.close(keep_sinks=sinks)  # a custom sink object may be passed again
+    _backend = LogBackend(level=LogLevel[level.upper()] if isinstance(level, str) else level, sinks=sinks,
+                          sample_rate=sample_rate, buffered=buffered, flush_interval=flush_interval)
+    return _backend
+
+
+def flush_logs():
+    '''Write out buffered records now, e.g. before prompting the user on stdin.'''
+    _backend.flush()
+
+
+def pretty_print(log_type: LogType, title: str = "", content: Any = None, is_error: bool = False, level: LogLevel = None):
+    if level is None:
+        level = LogLevel.ERROR if is_error or log_type in _ERROR_TYPES else LogLevel.INFO
+    if not _backend.enabled(level):
+        return
+    _backend.emit({"ts": time.time(), "level": level, "kind": "print", "log_type": log_type,
+                   "title": title, "message": None, "content": content})
+
+
+def pretty_error(title: str, error_msg: str, context: Any = None):
+    if not _backend.enabled(LogLevel.ERROR):
+        return
+    _backend.emit({"ts": time.time(), "level": LogLevel.ERROR, "kind": "error", "log_type": None,
+                   "title": title, "message": error_msg, "content": context})
 
 
 def section_header(title: str, emoji: str = "━"):
-    print(f"\n{Colors.BOLD}{Colors.CYAN}{emoji * 40}{Colors.RESET}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{title}{Colors.RESET}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{emoji * 40}{Colors.RESET}\n")
+    if not _backend.enabled(LogLevel.INFO):
+        return
+    _backend.emit({"ts": time.time(), "level": LogLevel.INFO, "kind": "header", "log_type": None,
+                   "title": title, "message": None, "content": emoji})
 
 
 def inline_highlight(text: str, key: str, color: str = Colors.YELLOW) -> str:
-    return text.replace(key, f"{Colors.BOLD}{color}{key}{Colors.RESET}")
\ No newline at end of file
+    return text.replace(key, f"{Colors.BOLD}{color}{key}{Colors.RESET}")
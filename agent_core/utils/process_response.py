@@ -1,11 +1,105 @@
 import json
 from typing import TYPE_CHECKING
 from .agent_response import AgentResponse
-from .logging_utils import pretty_error, LogType, pretty_print
+from .logging_utils import pretty_error, LogType, LogLevel, pretty_print
 
 if TYPE_CHECKING:
     from ..core import BuildAgent
 
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+def repair_json(response_text: str):
+    '''Best-effort local fix of an almost-valid JSON object, so a small defect does not cost an LLM re-ask.
+    Handles text before or after the object, code fences, single-quoted strings, Python literals (True/False/None),
+    trailing commas, raw newlines in strings and output cut off between members. Returns a dict or None.
+    A cut-off response is not repaired if the cut is inside a string, or if it asks for a tool call or claims the
+    task is complete: its arguments or final text may be incomplete, so the LLM is asked again instead.'''
+    start = response_text.find('{')
+    if start == -1:
+        return None
+    try:
+        # Valid object followed by trailing text
+        data, _ = json.JSONDecoder().raw_decode(response_text[start:])
+        return data if isinstance(data, dict) else None
+    except json.JSONDecodeError:
+        pass
+    out = []
+    stack = []
+    quote = None  # quote character of the string being copied
+    escape = False
+    cut_points = []  # (len(out), stack) after each complete member, where a truncated object can be closed
+    i, text = start, response_text
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+                if ch == "'":
+                    out[-1] = "'"  # \' is not a JSON escape
+                else:
+                    out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')  # double quote inside a single-quoted string
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1] in " \n\t\r,":
+                out.pop()  # trailing comma
+            if not stack:
+                break
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                break  # the object is complete, ignore anything after it
+            cut_points.append((len(out), list(stack)))
+        elif ch == ",":
+            cut_points.append((len(out), list(stack)))
+            out.append(ch)
+        elif ch.isalpha():
+            word = ch
+            while i + 1 < len(text) and text[i + 1].isalnum():
+                i += 1
+                word += text[i]
+            out.append(_LITERALS.get(word, word))
+        else:
+            out.append(ch)
+        i += 1
+    if quote:
+        return None  # cut inside a string: the value is incomplete
+    fixed = "".join(out)
+    truncated = bool(stack)
+    candidates = [fixed + "".join(_CLOSERS[c] for c in reversed(stack))]
+    if truncated:
+        # Cut off mid-member: drop back to the last complete member and close from there.
+        # A closed object that still doesn't parse is not cut down, that would silently lose the members after the defect.
+        candidates += ["".join(out[:length]).rstrip(" \n\t\r,") + "".join(_CLOSERS[c] for c in reversed(open_stack))
+                       for length, open_stack in reversed(cut_points)]
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        if truncated and (data.get("tool_call") or data.get("tool_calls") or data.get("task_complete")):
+            return None
+        return data
+    return None
+
 async def clean_response(response_text:str):
     # Extract JSON from response - handle cases where LLM adds extra text
         try:
@@ -21,6 +115,11 @@ async def clean_response(response_text:str):
             data = json.loads(json_str)
             return data
         except Exception as e:
+            # Fix what can be fixed locally before the agent loop asks the LLM again
+            data = repair_json(response_text)
+            if data is not None:
+                pretty_print(LogType.AGENT_INFO, "JSON Repaired", {"error": str(e)}, level=LogLevel.DEBUG)
+                return data
             pretty_error("JSON Parsing Failed", str(e), {"response": response_text[:200]})
             return None
         
@@ -53,6 +152,8 @@ async def inject_context_and_reinvoke(agent:"BuildAgent", agent_response:AgentRe
             "content": json.dumps(agent_response.model_dump()),
             "context": context
         })
+        if agent.context_manager:
+            await agent.context_manager.compact(agent.messages)
         new_response = await agent.llm_client.invoke_model(messages=agent.messages)
         return new_response
     except Exception as e:
@@ -71,6 +172,8 @@ async def handle_response_errors(agent:"BuildAgent", error_msg:str):
             "role": "system", 
             "content": f"Your previous response had an error: {error_msg}\n\nPlease respond again with valid JSON following the required format exactly."
         })
+        if agent.context_manager:
+            await agent.context_manager.compact(agent.messages)
         new_response = await agent.llm_client.invoke_model(messages=agent.messages)
         return new_response
     except Exception as e:
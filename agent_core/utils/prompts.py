@@ -3,13 +3,22 @@ from .agent_response import AgentResponse
 from agent_tools import MCPClient,MCPTool
 import json
 
-MEMORY_USE_PROMPT='''
-MANDATORY MEMORY WORKFLOW - FOLLOW THIS ORDER STRICTLY:
-BEFORE every task:
+MEMORY_RETRIEVE_PROMPT='''BEFORE every task:
   1. ALWAYS call get_memory(intent="<user's request>") to find relevant past context
   2. ALWAYS call get_memory(memory_type="learning") to find relevant past learnings
   3. Use retrieved context to inform your approach
+'''
+
+# Used instead of MEMORY_RETRIEVE_PROMPT when the agent prefetches memories itself
+MEMORY_PREFETCHED_PROMPT='''BEFORE every task:
+  1. Relevant past context and past learnings are retrieved for you and given in a "Retrieved memories" message before the user's request
+  2. Use them to inform your approach - do NOT call get_memory again for the same lookups
+  3. Call get_memory only if you need something more specific
+'''
 
+MEMORY_USE_PROMPT='''
+MANDATORY MEMORY WORKFLOW - FOLLOW THIS ORDER STRICTLY:
+{retrieve_section}
 AFTER every task or meaningful interaction:
   1. Save what you learned includings tips and mistakes with add_memory(content="...", metadata={{"type": "learning"}})
   2. Save any important facts or results with add_memory(content="...", metadata={{"type": "fact"}})
@@ -18,9 +27,11 @@ AFTER every task or meaningful interaction:
 
 MEMORY TOOL USAGE - EXACT PARAMETERS:
   • get_memory(intent="search text") - semantic search for memories
-  • get_memory(memory_type="name") - find by metadata type (BEST for tags)
+  • get_memory(memory_type="name") - find by metadata type (BEST for tags), add limit/offset to page through results
+  • get_memory(intent="search text", memory_type="name") - semantic search restricted to one type
   • get_memory(id="uuid-string") - get by ID if you have it
   • add_memory(content="text to save", metadata={{"type": "category"}})
+  • add_memories(memories=[{{"content": "...", "metadata": {{"type": "learning"}}}}, ...]) - save several memories in one call (preferred after a task)
 
 '''
 
@@ -37,9 +48,19 @@ Use human_in_loop(intent="...") to get user assistance when:
   
 '''
 
-def get_system_prompt(is_memory_enabled: bool = False, is_human_in_loop_enabled: bool = False):
-    memory_section = MEMORY_USE_PROMPT if is_memory_enabled else ''
+TOOL_SEARCH_PROMPT='''
+TOOL DISCOVERY:
+  • Only a few tools are listed below; many more are available
+  • The tools most relevant to each request are listed in a "Relevant tools" message before it
+  • If none of the listed tools fits, call search_tools(query="what you need to do", top_k=5) to find more
+  • Never call a tool you have not seen listed or returned by search_tools
+'''
+
+def get_system_prompt(is_memory_enabled: bool = False, is_human_in_loop_enabled: bool = False, is_memory_prefetch_enabled: bool = False, is_tool_search_enabled: bool = False):
+    retrieve_section = MEMORY_PREFETCHED_PROMPT if is_memory_prefetch_enabled else MEMORY_RETRIEVE_PROMPT
+    memory_section = MEMORY_USE_PROMPT.replace("{retrieve_section}", retrieve_section) if is_memory_enabled else ''
     human_loop_section = HUMAN_IN_LOOP_PROMPT if is_human_in_loop_enabled else ''
+    tool_search_section = TOOL_SEARCH_PROMPT if is_tool_search_enabled else ''
     
     system_prompt = f'''You are an AI agent that accomplishes tasks using available tools and human assistance when needed.
 
@@ -49,8 +70,9 @@ RULES:
 3. CRITICAL - Tool Call Execution:
    • If you need to do something or use a tool, IMMEDIATELY set tool_call=true with the tool_name and tool_args
    • DO NOT just describe what you will do - ACTUALLY DO IT in the same response
-   • Always use "get_tool_schema" to get correct arguments for any tool before calling it
+   • Tools are listed as (name, description, arguments JSON schema) - follow the schema exactly; call get_tool_schema(tool_name="...") only if a schema is missing
    • Never guess tool arguments
+   • To run several independent tools at once, set tool_call=true and list them in tool_calls as [{{"tool_name": "...", "tool_args": {{...}}}}, ...] instead of tool_name/tool_args; all results come back together
 4. tool_call behavior:
    • Set tool_call=true ONLY when you are making an ACTUAL tool call (not describing future actions)
    • Set tool_call=false ONLY when you have a final answer for the user
@@ -64,16 +86,16 @@ RESPONSE FORMAT (output ONLY this JSON):
 
 {memory_section}
 {human_loop_section}
-
+{tool_search_section}
 TOOLS AVAILABLE - Use ONLY exact names:
 '''
     return system_prompt
-def get_tools_info(tools:Tools):
+def get_tools_info(tools:Tools, names:list=None):
     if not tools:
         return f'''You dont have access to any tools, proceed with your existing knowledge base'''
     else:
         try:
-            tool_info = tools.get_tool_info() if hasattr(tools, 'get_tool_info') and callable(tools.get_tool_info) else "No tool info available"
+            tool_info = tools.get_tool_info(include_schema=True, names=names) if hasattr(tools, 'get_tool_info') and callable(tools.get_tool_info) else "No tool info available"
             return f''' you have access to the following tools\n
                     Available tools: {tool_info}'''
         except Exception as e:
@@ -85,5 +107,5 @@ def get_mcp_tools_info(mcp:MCPTool):
         return f'''You dont have access to any MCP tools, proceed with your existing knowledge base'''
     else:               
         return f'''You have access to the following MCP tools\n
-        Available MCP tools: {mcp.mcp_methods}'''
+        Available MCP tools: {mcp.get_mcp_info(include_schema=True)}'''
       
\ No newline at end of file
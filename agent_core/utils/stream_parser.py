@@ -0,0 +1,128 @@
+import json
+from typing import Optional, List, Tuple
+
+
+class StreamingResponseParser:
+    '''Incremental parser for a streamed AgentResponse JSON object.
+
+    Feed it chunks as they arrive: top-level fields are decoded as soon as their value is
+    complete (available in `fields`), and the `text` field is returned piece by piece while it
+    is still being streamed. Anything before the first "{" is ignored, like `clean_response`.'''
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}  # completed top-level fields
+        self.done = False  # the top-level object is closed
+        self.failed = False  # malformed JSON, the caller falls back to parsing the full response
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "start"  # start | key | key_str | colon | value | value_str | value_nested | value_prim | comma
+        self._key = None
+        self._start = None  # start index of the current key or value
+        self._text_pos = None  # next undecoded index inside a streaming "text" value
+
+    def feed(self, chunk: str) -> str:
+        '''Consume a chunk and return any new characters of the `text` field.'''
+        self.buffer += chunk
+        if self.done or self.failed:
+            return ""
+        delta = ""
+        try:
+            delta += self._scan()
+            if self._expect == "value_str" and self._key == "text":
+                delta += self._decode_text(len(self.buffer))
+        except ValueError:
+            self.failed = True
+        return delta
+
+    def ready_tool_calls(self) -> Optional[List[Tuple[str, dict]]]:
+        '''The tool calls to dispatch once tool_call is true and the call list or tool_name + tool_args are complete, else None.'''
+        if self.fields.get("tool_call") is not True:
+            return None
+        if isinstance(self.fields.get("tool_calls"), list) and self.fields["tool_calls"]:
+            calls = [(c.get("tool_name"), c.get("tool_args") or {}) for c in self.fields["tool_calls"] if isinstance(c, dict)]
+            return calls if all(isinstance(name, str) for name, _ in calls) else None
+        if isinstance(self.fields.get("tool_name"), str) and isinstance(self.fields.get("tool_args"), dict):
+            return [(self.fields["tool_name"], self.fields["tool_args"])]
+        return None
+
+    def _complete(self, end: int):
+        self.fields[self._key] = json.loads(self.buffer[self._start:end])
+        self._expect = "comma"
+
+    def _decode_text(self, end: int) -> str:
+        # Decode up to the last complete escape sequence so a split "\n" or "é" is never emitted half-way
+        raw, i = self.buffer[self._text_pos:end], 0
+        while i < len(raw):
+            if raw[i] == "\\":
+                step = 6 if i + 1 < len(raw) and raw[i + 1] == "u" else 2
+                if step == 6 and raw[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):
+                    step = 12  # high surrogate, wait for the low half of the pair
+                if i + step > len(raw):
+                    break
+                i += step
+            else:
+                i += 1
+        if not i:
+            return ""
+        self._text_pos += i
+        return json.loads(f'"{raw[:i]}"')
+
+    def _scan(self) -> str:
+        delta = ""
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._expect == "start":
+                if ch == "{":
+                    self._depth, self._expect = 1, "key"
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._expect == "key_str":
+                        self._key = json.loads(buf[self._start:i + 1])
+                        self._expect = "colon"
+                    elif self._expect == "value_str":
+                        if self._key == "text":
+                            delta += self._decode_text(i)
+                        self._complete(i + 1)
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == "key":
+                    self._start, self._expect = i, "key_str"
+                elif self._depth == 1 and self._expect == "value":
+                    self._start, self._expect = i, "value_str"
+                    self._text_pos = i + 1
+            elif ch in "{[":
+                if self._depth == 1 and self._expect == "value":
+                    self._start, self._expect = i, "value_nested"
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._expect == "value_nested":
+                    self._complete(i + 1)
+                elif self._depth == 0:
+                    if self._expect == "value_prim":
+                        self._complete(i)
+                    self.done = True
+                    self._pos = i + 1
+                    return delta
+            elif self._depth == 1:
+                if ch == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif ch == ",":
+                    if self._expect == "value_prim":
+                        self._complete(i)
+                    self._expect = "key"
+                elif not ch.isspace() and self._expect == "value":
+                    self._start, self._expect = i, "value_prim"
+            i += 1
+        self._pos = i
+        return delta
@@ -2,7 +2,7 @@ from agent_tools import Tools,MCPClient,MCPTool
 import json
 import asyncio
 from .agent_response import AgentResponse
-from .logging_utils import pretty_error, pretty_print, LogType
+from .logging_utils import pretty_error, pretty_print, flush_logs, LogType
 
 async def human_in_loop(intent: str) -> str:
     '''Use this tool when you need additional user assistance, extra information, user preferences, or clarification.
@@ -21,32 +21,59 @@ async def human_in_loop(intent: str) -> str:
         The user's response/input
     '''
     pretty_print(LogType.HUMAN_IN_LOOP, title=intent)
+    flush_logs()  # make sure the question is on screen before blocking on stdin
     response = input('Enter your response: ')
     return response
 
 async def get_tool_schema(tool_name: str, tools: Tools, mcp: MCPTool):
-    '''Fetch the schema for a given tool from either the local tools registry or the MCP client.'''
-    if tool_name in tools._tools:
-        schema= tools._tool_method_schema[tool_name].model_json_schema()
-        return schema
+    '''Fetch the cached, serialised schema for a given tool from either the local tools registry or the MCP client.'''
+    if tools and tool_name in tools._tools:
+        return tools.get_tool_json_schema(tool_name)
     elif mcp and tool_name in mcp.mcp_methods:
-        return mcp.mcp_method_schema[tool_name].model_json_schema() or mcp.mcp_method_schema[tool_name]
+        return mcp.mcp_method_json_schema.get(tool_name)
     else:
         return f"Error: Tool '{tool_name}' not found in either local tools or MCP client."
 
+def select_tools(query: str, tools: Tools, mcp: MCPTool, top_k: int = 5, exclude=()):
+    '''Rank local and MCP tools against the query with their BM25 indexes and return the top_k as (name, description, schema).'''
+    ranked = []
+    if tools:
+        ranked += [(score, name, False) for name, score in tools.tool_index.search(query, top_k, exclude)]
+    if mcp:
+        ranked += [(score, name, True) for name, score in mcp.tool_index.search(query, top_k, exclude)]
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    selected = []
+    for _, name, is_mcp in ranked[:top_k]:
+        selected += mcp.get_mcp_info(include_schema=True, names=[name]) if is_mcp else tools.get_tool_info(include_schema=True, names=[name])
+    return selected
+
+async def search_tools(query: str, tools: Tools, mcp: MCPTool, top_k: int = 5):
+    '''Find tools matching a description of what needs to be done; returns (name, description, schema) for the best matches.'''
+    selected = select_tools(query, tools, mcp, top_k)
+    return selected if selected else f"No tools found matching: {query}"
+
 async def make_tool_call(tool_name: str, tool_args: dict, tools: Tools):
-    '''Make a tool call by invoking the corresponding function from the tools registry.'''
+    '''Make a tool call by invoking the corresponding function from the tools registry, using the tool's execution policy and timeout.'''
     if tool_name not in tools._tools: 
         error_msg = f"Tool '{tool_name}' not found."
         pretty_error("Tool Not Found", error_msg, {"available_tools": list(tools._tools.keys())})
         return {"status": "error", "error": error_msg, "tool": tool_name}
     if tool_name in tools._tools:
-        tool_func = tools._tool_method[tool_name]
         if isinstance(tool_args, dict):
+            is_valid, validated = tools.validate_tool_args(tool_name, tool_args)
+            if not is_valid:
+                error_msg = f"Error: Invalid arguments for tool '{tool_name}': {validated}. Expected schema: {tools.get_tool_json_schema(tool_name)}"
+                pretty_error("Invalid Tool Arguments", validated, {"tool": tool_name, "arguments": tool_args})
+                return {"status": "error", "error": error_msg, "tool": tool_name, "args": tool_args}
+            tool_args = validated
             try:
-                output=tool_func(**tool_args)
+                output=await tools.run_tool(tool_name, tool_args)
                 # Wrap successful execution
                 return {"status": "success", "output": output, "tool": tool_name, "args": tool_args}
+            except asyncio.TimeoutError:
+                error_msg = f"Error: Tool '{tool_name}' timed out and was cancelled."
+                pretty_error("Tool Timeout", error_msg, {"tool": tool_name, "arguments": tool_args})
+                return {"status": "error", "error": error_msg, "tool": tool_name, "args": tool_args}
             except Exception as e:
                 error_msg = f"Error executing tool '{tool_name}' with arguments {tool_args}: {e}"
                 pretty_error("Tool Execution Failed", str(e), {"tool": tool_name, "arguments": tool_args})
@@ -64,6 +91,11 @@ async def make_mcp_tool_call(tool_name: str, tool_args: dict, mcp: MCPTool):
         return {"status": "error", "error": error_msg, "tool": tool_name}
     if mcp and tool_name in mcp.mcp_methods:
         if isinstance(tool_args, dict):
+            is_valid, validated = mcp.validate_tool_args(tool_name, tool_args)
+            if not is_valid:
+                error_msg = f"Error: Invalid arguments for MCP tool '{tool_name}': {validated}. Expected schema: {mcp.mcp_method_json_schema.get(tool_name)}"
+                pretty_error("Invalid MCP Arguments", validated, {"tool": tool_name, "arguments": tool_args})
+                return {"status": "error", "error": error_msg, "tool": tool_name, "args": tool_args}
             try:
                 session = await mcp.get_session(tool_name)
                 if not session:
@@ -72,6 +104,10 @@ async def make_mcp_tool_call(tool_name: str, tool_args: dict, mcp: MCPTool):
                     return {"status": "error", "error": error_msg, "tool": tool_name}
                 result = await session.call_tool(tool_name, tool_args)
                 return {"status": "success", "output": result, "tool": tool_name, "args": tool_args}
+            except asyncio.TimeoutError:
+                error_msg = f"Error: MCP Tool '{tool_name}' timed out and was cancelled."
+                pretty_error("MCP Tool Timeout", error_msg, {"tool": tool_name, "arguments": tool_args})
+                return {"status": "error", "error": error_msg, "tool": tool_name, "args": tool_args}
             except Exception as e:
                 error_msg = f"Error executing MCP tool '{tool_name}' with arguments {tool_args}: {e}"
                 pretty_error("MCP Tool Execution Failed", str(e), {"tool": tool_name, "arguments": tool_args})
@@ -93,7 +129,13 @@ async def handle_tool_call(tool_name: str, tool_args: dict, tools: Tools=None, m
             return {"status": "success", "output": user_response, "tool": tool_name, "args": tool_args}
         
         elif tool_name == 'get_tool_schema': 
-            return await get_tool_schema(tool_name, tools, mcp)
+            return await get_tool_schema((tool_args or {}).get('tool_name'), tools, mcp)
+
+        elif tool_name == 'search_tools' and not (tools and tool_name in tools._tools):
+            args = tool_args or {}
+            output = await search_tools(args.get('query', ''), tools, mcp, int(args.get('top_k', 5)))
+            pretty_print(LogType.TOOL_RESPONSE, "Tool Search", {"query": args.get('query', ''), "results": [item[0] for item in output] if isinstance(output, list) else output})
+            return {"status": "success", "output": output, "tool": tool_name, "args": tool_args}
         
         elif tools and mcp and tool_name not in tools._tools and tool_name not in mcp.mcp_methods:
             error_msg = f"Error: Tool '{tool_name}' not found."
@@ -114,5 +156,9 @@ async def handle_tool_call(tool_name: str, tool_args: dict, tools: Tools=None, m
         error_msg = f"Error executing tool '{tool_name}': {e}"
         pretty_error("Tool Execution Error", str(e), {"tool": tool_name})
         return {"status": "error", "error": error_msg}
-    
 
+
+async def handle_tool_calls(tool_calls: list, tools: Tools=None, mcp: MCPTool=None):
+    '''Run several (tool_name, tool_args) calls concurrently and return their outputs in the same order.
+    MCP calls go through their sessions, local tools through their execution policy (thread pool by default).'''
+    return await asyncio.gather(*(handle_tool_call(tool_name, tool_args, tools, mcp) for tool_name, tool_args in tool_calls))
@@ -1,3 +1,3 @@
-from .tools_method import Tools
-from .mcp_method import MCPClient,MCPTool
-__all__ = ['Tools','MCPClient','MCPTool']
\ No newline at end of file
+from .tools_method import Tools, ExecutionPolicy, shutdown_tool_executors
+from .mcp_method import MCPClient,MCPTool,MCPSessionPool,MCPServerRegistry,SharedMCPServer,MCPCatalogCache,get_mcp_registry,configure_mcp_registry
+__all__ = ['Tools','ExecutionPolicy','shutdown_tool_executors','MCPClient','MCPTool','MCPSessionPool','MCPServerRegistry','SharedMCPServer','MCPCatalogCache','get_mcp_registry','configure_mcp_registry']
@@ -1,10 +1,19 @@
 from mcp import StdioServerParameters, stdio_client, ClientSession
+from mcp import types
 from contextlib import AsyncExitStack    
+from jsonschema.validators import validator_for
 import asyncio
+import hashlib
+import json
+import os
+import time
+import anyio
+from .tool_index import ToolIndex
 
 class MCPClient:
-    def __init__(self, server_script_path: str):
+    def __init__(self, server_script_path: str, args: list = None, on_tools_changed=None):
         self.session: ClientSession
+        self.on_tools_changed = on_tools_changed #async callback(client) run after the server reports a changed tool list
         self.exit_stack = AsyncExitStack()
         self._mcp_methods = {}
         self._mcp_method_schema = {}
@@ -18,7 +27,7 @@ class MCPClient:
         self.command = "python" if is_python else "node"
         self.server_params = StdioServerParameters(
             command=self.command,
-            args=[server_script_path],
+            args=[server_script_path, *(args or [])],
             env=None
         )
 
@@ -26,18 +35,35 @@ class MCPClient:
         try:
             stdio_transport = await self.exit_stack.enter_async_context(stdio_client(self.server_params))
             self.stdio, self.write = stdio_transport
-            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
+            self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write, message_handler=self._handle_message))
             await self.session.initialize()
-            response = await self.session.list_tools()
-            tools = response.tools
-            self._mcp_methods = {tool.name: tool.description for tool in tools}
-            self._client={tool.name:self.session for tool in tools}
-            self._mcp_method_schema = {tool.name: tool.inputSchema for tool in tools}
+            await self.refresh_tools()
             return self
         except Exception as e:
             print(f"Failed to establish connection: {e}")
             return None
 
+    async def refresh_tools(self):
+        response = await self.session.list_tools()
+        tools = response.tools
+        self._mcp_methods = {tool.name: tool.description for tool in tools}
+        self._client={tool.name:self.session for tool in tools}
+        self._mcp_method_schema = {tool.name: tool.inputSchema for tool in tools}
+
+    async def _handle_message(self, message):
+        notification = getattr(message, "root", message)
+        if isinstance(notification, types.ToolListChangedNotification):
+            # Re-list from a separate task: this handler runs on the session's receive loop, which list_tools needs
+            asyncio.create_task(self._tools_changed())
+
+    async def _tools_changed(self):
+        try:
+            await self.refresh_tools()
+            if self.on_tools_changed:
+                await self.on_tools_changed(self)
+        except Exception as e:
+            print(f"Failed to refresh MCP tools for '{self.server_script_path}': {e}")
+
     async def disconnect(self):
         await self.exit_stack.aclose()
         
@@ -51,43 +77,459 @@ class MCPClient:
             return f"Error executing MCP tool '{tool_name}' with arguments {tool_args}: {e}"
         
 
+# Errors meaning the stdio pipe / server process is gone, as opposed to a tool failing
+_CONNECTION_ERRORS = (ConnectionError, EOFError, OSError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+# Raised when writing the request to a closed session: the server never saw it, so sending it again is safe
+_UNSENT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+
+class _PooledSession:
+    '''One server process and its session. The connection is opened and closed by a dedicated task,
+    because the stdio transport must be exited from the task that entered it.'''
+    def __init__(self, server_script_path: str, args: list = None, on_tools_changed=None):
+        self.server_script_path = server_script_path
+        self.args = args
+        self.on_tools_changed = on_tools_changed
+        self.client = None
+        self.in_flight = 0
+        self.healthy = False
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = None
+
+    async def start(self, timeout: float):
+        self._task = asyncio.create_task(self._serve())
+        await asyncio.wait_for(self._ready.wait(), timeout)
+        return self.healthy
+
+    async def _serve(self):
+        client = MCPClient(server_script_path=self.server_script_path, args=self.args, on_tools_changed=self.on_tools_changed)
+        try:
+            if await client.connect() is not None:
+                self.client = client
+                self.healthy = True
+            self._ready.set()
+            if self.healthy:
+                await self._stop.wait()
+        finally:
+            self.healthy = False
+            self._ready.set()
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+    async def close(self):
+        self.healthy = False
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), 5)
+            except Exception:
+                self._task.cancel()
+
+
+class MCPSessionPool:
+    def __init__(self, server_script_path: str, size: int = 1, args: list = None, max_in_flight: int = 8, call_timeout: float = 60.0, health_check_interval: float = 30.0, connect_timeout: float = 30.0, on_tools_changed=None, retry_tools: tuple = ()):
+        '''Pool of `size` sessions (one server process each) for one MCP server.
+        At most max_in_flight calls run at once across the pool; each call goes to the least busy healthy session
+        and is cancelled after call_timeout seconds. Sessions are pinged every health_check_interval seconds and
+        replaced when they fail. A call whose request could not be written to a dead connection is retried once on
+        a fresh session; one that fails after it was sent is only retried for tools named in retry_tools (tools that
+        are safe to run twice), since the server may already have run it.
+        on_tools_changed(client) is awaited when the server reports that its tool list changed.'''
+        self.server_script_path = server_script_path
+        self.args = args
+        self.on_tools_changed = on_tools_changed
+        self.retry_tools = retry_tools
+        self.size = size
+        self.max_in_flight = max_in_flight
+        self.call_timeout = call_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.sessions = []
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._reconnect_lock = asyncio.Lock()
+        self._health_task = None
+
+    @property
+    def tools(self) -> MCPClient:
+        '''Client of a healthy session, carrying the discovered tool names, descriptions and schemas.'''
+        return next((session.client for session in self.sessions if session.healthy), None)
+
+    async def start(self):
+        self.sessions = [_PooledSession(self.server_script_path, self.args, self.on_tools_changed) for _ in range(self.size)]
+        await asyncio.gather(*(session.start(self.connect_timeout) for session in self.sessions), return_exceptions=True)
+        if self.tools is None:
+            await self.close()
+            raise RuntimeError(f"Could not start MCP server '{self.server_script_path}'.")
+        if self.health_check_interval:
+            self._health_task = asyncio.create_task(self._health_loop())
+        return self
+
+    async def call_tool(self, tool_name: str, tool_args: dict, timeout: float = None):
+        '''Same contract as ClientSession.call_tool; raises asyncio.TimeoutError when the call takes longer than the timeout.'''
+        async with self._semaphore:
+            for attempt in range(2):
+                session = await self._pick()
+                session.in_flight += 1
+                try:
+                    return await asyncio.wait_for(session.client.session.call_tool(tool_name, tool_args), timeout or self.call_timeout)
+                except asyncio.TimeoutError:
+                    raise  # a subclass of OSError; the health check decides whether the server is hung
+                except _CONNECTION_ERRORS as e:
+                    await self._replace(session)
+                    if attempt or not (isinstance(e, _UNSENT_ERRORS) or tool_name in self.retry_tools):
+                        raise
+                finally:
+                    session.in_flight -= 1
+
+    async def _pick(self) -> _PooledSession:
+        healthy = [session for session in self.sessions if session.healthy]
+        if not healthy:
+            await self._replace(*self.sessions)
+            healthy = [session for session in self.sessions if session.healthy]
+            if not healthy:
+                raise ConnectionError(f"No healthy session for MCP server '{self.server_script_path}'.")
+        return min(healthy, key=lambda session: session.in_flight)
+
+    async def _replace(self, *stale: _PooledSession):
+        async with self._reconnect_lock:
+            for old in stale:
+                if old not in self.sessions:
+                    continue  # already replaced by a concurrent caller
+                new = _PooledSession(self.server_script_path, self.args, self.on_tools_changed)
+                self.sessions[self.sessions.index(old)] = new
+                asyncio.create_task(old.close())
+                try:
+                    await new.start(self.connect_timeout)
+                except Exception:
+                    pass
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await self.check_health()
+
+    async def check_health(self) -> int:
+        '''Ping every session and reconnect the ones that do not answer. Returns the number of healthy sessions.'''
+        async def ping(session):
+            try:
+                await asyncio.wait_for(session.client.session.send_ping(), self.call_timeout)
+                return True
+            except Exception:
+                return False
+        sessions = list(self.sessions)
+        results = await asyncio.gather(*(ping(session) if session.healthy else asyncio.sleep(0, False) for session in sessions))
+        failed = [session for session, ok in zip(sessions, results) if not ok]
+        if failed:
+            await self._replace(*failed)
+        return sum(session.healthy for session in self.sessions)
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        await asyncio.gather(*(session.close() for session in self.sessions), return_exceptions=True)
+        self.sessions = []
+
+
+class MCPCatalogCache:
+    def __init__(self, path: str = "./mcp_catalog.json"):
+        '''On-disk cache of MCP tool catalogs (names, descriptions, input schemas), keyed by server script path and
+        arguments. Entries carry a hash of the script file, so editing the server invalidates them.'''
+        self.path = path
+        self._entries = None
+
+    @staticmethod
+    def _key(server_script_path: str, args: list) -> str:
+        return json.dumps([os.path.abspath(server_script_path), list(args or [])])
+
+    @staticmethod
+    def script_hash(server_script_path: str):
+        try:
+            with open(server_script_path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, server_script_path: str, args: list = None):
+        '''(methods, schemas) cached for this server, or None if missing or the script changed.'''
+        entry = self._load().get(self._key(server_script_path, args))
+        if not entry or entry.get("script_hash") != self.script_hash(server_script_path):
+            return None
+        return entry["methods"], entry["schemas"]
+
+    def put(self, server_script_path: str, args: list, methods: dict, schemas: dict):
+        self._load()[self._key(server_script_path, args)] = {
+            "script_hash": self.script_hash(server_script_path),
+            "methods": methods,
+            "schemas": schemas,
+            "updated_at": time.time(),
+        }
+        # Write to a temporary file and rename, so a crash never leaves a half-written catalog
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, default=str)
+        os.replace(tmp_path, self.path)
+
+
+class SharedMCPServer:
+    def __init__(self, server_script_path: str, args: list = None, idle_timeout: float = 300.0, catalog_cache: MCPCatalogCache = None, **pool_options):
+        '''One MCP server shared by every MCPTool that uses it. The session pool is started on first use and
+        stopped after idle_timeout seconds without calls; the discovered tools are kept, so agents can be
+        built and the server restarted on the next call without a new list_tools handshake.
+        With a catalog_cache the tools are known before the server ever starts in this process; the cached
+        catalog is checked against the server's list_tools once the first call has started it (or when the
+        server reports a change), and listeners are called whenever the tools change.'''
+        self.server_script_path = server_script_path
+        self.args = list(args or [])
+        self.idle_timeout = idle_timeout
+        self.catalog_cache = catalog_cache
+        self.pool_options = pool_options
+        self.pool = None
+        self.mcp_methods = None  # tool_name: description, from list_tools
+        self.mcp_method_schema = None  # tool_name: input schema
+        self.listeners = []  # async callback(server) awaited after the catalog changed
+        self.in_flight = 0
+        self.last_used = 0.0
+        self._loop = None
+        self._start_lock = None
+        self._idle_task = None
+
+    async def ensure_catalog(self):
+        '''Discover the server's tools once: from the catalog cache if possible, otherwise by starting the server.
+        A cached catalog is refreshed when the pool starts for the first call, so a cache hit spawns nothing.'''
+        if self.mcp_methods is None and self.catalog_cache is not None:
+            cached = self.catalog_cache.get(self.server_script_path, self.args)
+            if cached is not None:
+                self.mcp_methods, self.mcp_method_schema = cached
+        if self.mcp_methods is None:
+            await self._ensure_pool()
+        return self.mcp_methods, self.mcp_method_schema
+
+    async def _update_catalog(self, methods: dict, schemas: dict):
+        '''Store a freshly listed catalog, persist it and notify listeners if it differs from what they have.'''
+        changed = (methods, schemas) != (self.mcp_methods, self.mcp_method_schema)
+        self.mcp_methods, self.mcp_method_schema = dict(methods), dict(schemas)
+        if self.catalog_cache is not None:
+            try:
+                self.catalog_cache.put(self.server_script_path, self.args, self.mcp_methods, self.mcp_method_schema)
+            except OSError as e:
+                print(f"Could not write MCP catalog cache '{self.catalog_cache.path}': {e}")
+        if changed:
+            for listener in list(self.listeners):
+                await listener(self)
+
+    async def _on_tools_changed(self, client: MCPClient):
+        await self._update_catalog(client._mcp_methods, client._mcp_method_schema)
+
+    async def call_tool(self, tool_name: str, tool_args: dict, timeout: float = None):
+        pool = await self._ensure_pool()
+        self.in_flight += 1
+        try:
+            return await pool.call_tool(tool_name, tool_args, timeout=timeout)
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    async def _ensure_pool(self) -> MCPSessionPool:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio primitives and the transports belong to one event loop
+            self._stop_on_old_loop()
+            self._loop, self._start_lock = loop, asyncio.Lock()
+        async with self._start_lock:
+            if self.pool is None:
+                pool = await MCPSessionPool(self.server_script_path, args=self.args, on_tools_changed=self._on_tools_changed, **self.pool_options).start()
+                self.pool = pool
+                await self._update_catalog(pool.tools._mcp_methods, pool.tools._mcp_method_schema)
+                self.last_used = time.monotonic()
+                if self.idle_timeout:
+                    self._idle_task = asyncio.create_task(self._stop_when_idle())
+        return self.pool
+
+    def _stop_on_old_loop(self):
+        '''Stop the pool started on the previous event loop, from that loop, before starting a new one.'''
+        pool, idle_task, old_loop = self.pool, self._idle_task, self._loop
+        self.pool, self._idle_task = None, None
+        if pool is None or old_loop is None or old_loop.is_closed():
+            return  # a closed loop can't run anything; its pipes close (and the servers exit) when collected
+
+        def shutdown():
+            if idle_task is not None:
+                idle_task.cancel()
+            old_loop.create_task(pool.close())
+        # Runs once that loop gets control again
+        old_loop.call_soon_threadsafe(shutdown)
+
+    async def _stop_when_idle(self):
+        while self.pool is not None:
+            await asyncio.sleep(max(self.idle_timeout - (time.monotonic() - self.last_used), 0.05))
+            if self.in_flight == 0 and time.monotonic() - self.last_used >= self.idle_timeout:
+                await self.stop(from_idle_task=True)
+                return
+
+    async def stop(self, from_idle_task: bool = False):
+        '''Stop the server processes; the tool catalog is kept and the next call starts them again.'''
+        pool, self.pool = self.pool, None
+        if self._idle_task is not None and not from_idle_task:
+            self._idle_task.cancel()
+        self._idle_task = None
+        if pool is not None:
+            await pool.close()
+
+
+class MCPServerRegistry:
+    def __init__(self, idle_timeout: float = 300.0, catalog_path: str = "./mcp_catalog.json"):
+        '''Process-wide set of MCP servers, deduplicated by script path and arguments.
+        Tool catalogs are cached on disk at catalog_path (None disables the cache).'''
+        self.idle_timeout = idle_timeout
+        self.catalog_cache = MCPCatalogCache(catalog_path) if catalog_path else None
+        self.servers = {}
+
+    def get_server(self, server_script_path: str, args: list = None, **pool_options) -> SharedMCPServer:
+        '''Return the shared server for this script and arguments, creating it (not starting it) if needed.
+        Pool options only apply when the server is first registered.'''
+        key = (os.path.abspath(server_script_path), tuple(args or []))
+        if key not in self.servers:
+            self.servers[key] = SharedMCPServer(server_script_path, args, idle_timeout=self.idle_timeout, catalog_cache=self.catalog_cache, **pool_options)
+        return self.servers[key]
+
+    async def aclose(self):
+        '''Stop every running server.'''
+        await asyncio.gather(*(server.stop() for server in self.servers.values()), return_exceptions=True)
+
+    async def stop_loop_servers(self):
+        '''Stop the servers running on the current event loop, e.g. before that loop is closed.'''
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(server.stop() for server in self.servers.values() if server._loop is loop), return_exceptions=True)
+
+
+_mcp_registry = None
+
+def get_mcp_registry() -> MCPServerRegistry:
+    global _mcp_registry
+    if _mcp_registry is None:
+        _mcp_registry = MCPServerRegistry()
+    return _mcp_registry
+
+def configure_mcp_registry(idle_timeout: float = 300.0, catalog_path: str = "./mcp_catalog.json") -> MCPServerRegistry:
+    '''Replace the process-wide registry (servers of the previous one keep running until stopped).'''
+    global _mcp_registry
+    _mcp_registry = MCPServerRegistry(idle_timeout=idle_timeout, catalog_path=catalog_path)
+    return _mcp_registry
+
+
 class MCPTool:
-    def __init__(self):
-        self.mcp_clients={} #mcp_client_name: mcp_client_object
+    def __init__(self, pool_size: int = 1, max_in_flight: int = 8, call_timeout: float = 60.0, health_check_interval: float = 30.0, registry: MCPServerRegistry = None):
+        '''Registry of MCP servers and their tools for one agent. Servers come from a MCPServerRegistry (the
+        process-wide one unless registry is given), so agents using the same server share its processes;
+        the pool options apply to servers this MCPTool registers first.'''
+        self.pool_options={"size": pool_size, "max_in_flight": max_in_flight, "call_timeout": call_timeout, "health_check_interval": health_check_interval}
+        self.registry=registry
+        self.mcp_servers={} #(server_script_path, tuple(args)): SharedMCPServer
+        self.mcp_clients={} #tool_name: SharedMCPServer serving it
         self.mcp_methods={}
         self.mcp_method_schema={}
+        self.mcp_method_json_schema={} #serialised once per tool, reused by the prompt and get_tool_schema
+        self.mcp_method_validator={} #compiled jsonschema validator per tool
+        self.tool_index=ToolIndex() #BM25 over names and descriptions, for retrieval-based tool selection
         
     async def get_session(self, tool_name:str):
         if tool_name not in self.mcp_methods:
             return f"Error: MCP Tool '{tool_name}' not found."
         return self.mcp_clients.get(tool_name, None)
         
-    async def add_mcp_client(self, mcp_client_path:str):
-        mcp_client = MCPClient(server_script_path=mcp_client_path)
-        await mcp_client.connect()
-        if isinstance(mcp_client, MCPClient):
-            print(f"Connected to MCP client with methods: {mcp_client._mcp_methods}")
-            self.mcp_clients.update(mcp_client._mcp_client) #we can call tools
-            self.mcp_methods.update(mcp_client._mcp_methods)
-            self.mcp_method_schema.update(mcp_client._mcp_method_schema)
-        else:
-            print(f"Invalid MCP client provided: {mcp_client}. Skipping.")
+    async def add_mcp_client(self, mcp_client_path:str, args:list=None, **pool_options):
+        '''Register the server's tools. The server is shared through the registry and only started if its tools
+        are not known yet; pool_options override the MCPTool defaults.'''
+        server = (self.registry or get_mcp_registry()).get_server(mcp_client_path, args, **{**self.pool_options, **pool_options})
+        try:
+            methods, schemas = await server.ensure_catalog()
+        except Exception as e:
+            print(f"Invalid MCP client provided: {mcp_client_path} ({e}). Skipping.")
+            return
+        print(f"Connected to MCP client with methods: {methods}")
+        self.mcp_servers[(mcp_client_path, tuple(args or []))] = server
+        self._register_server_tools(server)
+        if self._sync_server not in server.listeners:
+            server.listeners.append(self._sync_server)
+
+    def _register_server_tools(self, server: SharedMCPServer):
+        self.mcp_clients.update({tool_name: server for tool_name in server.mcp_methods}) #we can call tools
+        self.mcp_methods.update(server.mcp_methods)
+        self.mcp_method_schema.update(server.mcp_method_schema)
+        self._compile_schemas(server.mcp_method_schema)
+        for tool_name, description in server.mcp_methods.items():
+            self.tool_index.add(tool_name, description or "")
+
+    def _unregister_server_tools(self, server: SharedMCPServer):
+        for method_name in [name for name, owner in self.mcp_clients.items() if owner is server]:
+            del self.mcp_clients[method_name]
+            self.mcp_methods.pop(method_name, None)
+            self.mcp_method_schema.pop(method_name, None)
+            self.mcp_method_json_schema.pop(method_name, None)
+            self.mcp_method_validator.pop(method_name, None)
+            self.tool_index.remove(method_name)
+
+    async def _sync_server(self, server: SharedMCPServer):
+        '''Pick up a changed tool catalog (after the server started or sent a tools/list_changed notification).'''
+        if server in self.mcp_servers.values():
+            self._unregister_server_tools(server)
+            self._register_server_tools(server)
     
-    async def remove_mcp_client(self, mcp_client_path:str):
-        if mcp_client_path in self.mcp_clients:
-            mcp_client = self.mcp_clients[mcp_client_path]
-            await mcp_client.disconnect()
-            del self.mcp_clients[mcp_client_path]
-            # Also remove associated methods and schemas
-            for method_name in list(self.mcp_methods.keys()):
-                if method_name in mcp_client._mcp_methods:
-                    del self.mcp_methods[method_name]
-                    del self.mcp_method_schema[method_name]
-        else:
+    async def remove_mcp_client(self, mcp_client_path:str, args:list=None):
+        '''Remove the server's tools from this MCPTool. The shared server stops once it is idle.
+        Without args every server registered for this script is removed.'''
+        keys = [key for key in self.mcp_servers if key[0] == mcp_client_path and (args is None or key[1] == tuple(args))]
+        if not keys:
             print(f"MCP client '{mcp_client_path}' not found. Cannot remove.")
+        for key in keys:
+            server = self.mcp_servers.pop(key)
+            # Also remove associated methods and schemas
+            self._unregister_server_tools(server)
+            if self._sync_server in server.listeners:
+                server.listeners.remove(self._sync_server)
+
+    async def aclose(self):
+        '''Remove every server from this MCPTool and stop them (also for other agents sharing them).'''
+        servers = list(self.mcp_servers.values())
+        for mcp_client_path, args in list(self.mcp_servers):
+            await self.remove_mcp_client(mcp_client_path, list(args))
+        for server in servers:
+            await server.stop()
     
-    def get_mcp_info(self):
-        return list(self.mcp_methods.items())
+    def _compile_schemas(self, schemas:dict):
+        for tool_name, schema in schemas.items():
+            schema = schema or {"type": "object"}
+            self.mcp_method_json_schema[tool_name] = json.dumps(schema, separators=(",", ":"))
+            self.mcp_method_validator[tool_name] = validator_for(schema)(schema)
+
+    def validate_tool_args(self, tool_name:str, tool_args:dict):
+        '''Validate arguments against the tool's compiled input schema. Returns (True, args) or (False, error message).'''
+        validator = self.mcp_method_validator.get(tool_name)
+        if validator is None:
+            return True, tool_args
+        errors = [f"{'/'.join(str(p) for p in error.path) or '<root>'}: {error.message}" for error in validator.iter_errors(tool_args)]
+        if errors:
+            return False, "; ".join(errors)
+        return True, tool_args
+
+    def get_mcp_info(self, include_schema:bool=False, names=None):
+        '''(name, description[, schema]) for every MCP tool, or only for the given names.'''
+        items = [(name, self.mcp_methods[name]) for name in names if name in self.mcp_methods] if names is not None else self.mcp_methods.items()
+        if include_schema:
+            return [(name, description, self.mcp_method_json_schema.get(name)) for name, description in items]
+        return list(items)
         
 
 
@@ -0,0 +1,64 @@
+import math
+import re
+from collections import Counter
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Za-z][a-z]*|\d+")
+
+def tokenize(text: str) -> list:
+    '''Lower-cased words; snake_case and camelCase names are split into their parts.'''
+    return [word.lower() for word in _WORD.findall(text or "")]
+
+class ToolIndex:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        '''BM25 index over tool names and descriptions, updated as tools are registered or removed.'''
+        self.k1 = k1
+        self.b = b
+        self._docs = {}  # tool_name: Counter of terms
+        self._lengths = {}
+        self._postings = {}  # term: {tool_name: term frequency}
+        self._total_length = 0
+
+    def add(self, name: str, description: str = ""):
+        if name in self._docs:
+            self.remove(name)
+        # The name is repeated so a query that names the tool ranks it first
+        terms = Counter(tokenize(name) * 2 + tokenize(description))
+        self._docs[name] = terms
+        self._lengths[name] = sum(terms.values())
+        self._total_length += self._lengths[name]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[name] = tf
+
+    def remove(self, name: str):
+        terms = self._docs.pop(name, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(name)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[name]
+            if not postings:
+                del self._postings[term]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._docs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def search(self, query: str, top_k: int = 5, exclude=()) -> list:
+        '''Return up to top_k (tool_name, score) pairs, best first. Tools sharing no term with the query are left out.'''
+        if not self._docs:
+            return []
+        count = len(self._docs)
+        average_length = self._total_length / count or 1
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for name, tf in postings.items():
+                if name not in exclude:
+                    scores[name] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self._lengths[name] / average_length))
+        return scores.most_common(top_k)
@@ -1,15 +1,58 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, ValidationError
 from pydantic import create_model
-from typing import Callable
+from typing import Callable, Optional
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import json
+import asyncio
 import inspect
+from .tool_index import ToolIndex
+
+class ExecutionPolicy(str, Enum):
+    '''Where a synchronous tool runs: on the event loop, in a thread pool, or in a process pool.'''
+    INLINE  = "inline"
+    THREAD  = "thread"
+    PROCESS = "process"
+
+_process_pool = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor()
+    return _process_pool
+
+def shutdown_tool_executors():
+    '''Shut down the shared process pool used by PROCESS tools.'''
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
 class Tools:
-    def __init__(self):
+    def __init__(self, default_timeout: float = 120.0):
         self._tools={}
         self._tool_method_schema={}
         self._tool_method={}
-    
-    def add_tool(self,method:Callable):
-        '''make the agent aware of the method as a callable tool'''
+        self._tool_policy={}
+        self._tool_timeout={}
+        self._tool_early_dispatch=set() #tools that may start while the LLM response is still streaming
+        self._tool_json_schema={} #serialised once at registration, reused by the prompt and get_tool_schema
+        self.default_timeout=default_timeout
+        self.tool_index=ToolIndex() #BM25 over names and docstrings, for retrieval-based tool selection
+
+    def add_tool(self,method:Callable=None,*,execution:ExecutionPolicy=ExecutionPolicy.THREAD,timeout:float=None,early_dispatch:bool=False):
+        '''make the agent aware of the method as a callable tool.
+        Can be used as @tools.add_tool or @tools.add_tool(execution="process", timeout=30).
+        Coroutine functions are always awaited on the event loop; execution only applies to synchronous tools.
+        early_dispatch=True lets a streaming run start the tool before the response is complete and validated;
+        only set it for idempotent tools, since the call may be for a response that is then discarded.'''
+        if method is None:
+            return lambda method: self.add_tool(method, execution=execution, timeout=timeout, early_dispatch=early_dispatch)
+        execution=ExecutionPolicy(execution)
+        if execution is ExecutionPolicy.PROCESS and inspect.iscoroutinefunction(method):
+            raise ValueError(f"Coroutine tool '{method.__name__}' cannot use the process execution policy.")
         fields={}
         sig = inspect.signature(method)
         for param in sig.parameters.values():
@@ -17,21 +60,66 @@ class Tools:
                 raise ValueError(f"All parameters must have type annotations. Missing for parameter: {param.name} in method: {method.__name__}")
             if param.default is inspect.Parameter.empty:
                 fields[param.name] = (param.annotation, ...)
+            elif param.default is None:
+                # A None default means the model may pass null explicitly
+                fields[param.name] = (Optional[param.annotation], None)
             else:
                 fields[param.name] = (param.annotation, param.default)
-        method_schema = create_model(f"{method.__name__}_schema", **fields)
+        # extra="forbid" so unknown arguments are rejected before the tool runs
+        method_schema = create_model(f"{method.__name__}_schema", __config__=ConfigDict(extra="forbid"), **fields)
         self._tools[method.__name__]=method.__doc__
         self._tool_method_schema[method.__name__]=method_schema
         self._tool_method[method.__name__]=method
+        self._tool_policy[method.__name__]=execution
+        self._tool_timeout[method.__name__]=timeout
+        if early_dispatch:
+            self._tool_early_dispatch.add(method.__name__)
+        else:
+            self._tool_early_dispatch.discard(method.__name__)
+        self._tool_json_schema[method.__name__]=json.dumps(method_schema.model_json_schema(), separators=(",", ":"))
+        self.tool_index.add(method.__name__, method.__doc__ or "")
         return method #returning the method so orignal functionality is not lost, and it can be used as a normal function as well
-        
+
+    async def run_tool(self,method_name:str,tool_args:dict):
+        '''Run a registered tool according to its execution policy and timeout.
+        Raises asyncio.TimeoutError if the tool does not finish in time; the pending call is cancelled
+        (a thread or process that already started cannot be interrupted and is abandoned).'''
+        method=self._tool_method[method_name]
+        timeout=self._tool_timeout.get(method_name) or self.default_timeout
+        if inspect.iscoroutinefunction(method):
+            return await asyncio.wait_for(method(**tool_args), timeout)
+        policy=self._tool_policy.get(method_name, ExecutionPolicy.THREAD)
+        if policy is ExecutionPolicy.INLINE:
+            return method(**tool_args)  # blocks the loop, so no timeout can be applied
+        loop=asyncio.get_running_loop()
+        executor=_get_process_pool() if policy is ExecutionPolicy.PROCESS else None
+        return await asyncio.wait_for(loop.run_in_executor(executor, functools.partial(method, **tool_args)), timeout)
+
+    def allows_early_dispatch(self,method_name:str) -> bool:
+        return method_name in self._tool_early_dispatch
+
+    def validate_tool_args(self,method_name:str,tool_args:dict):
+        '''Validate and coerce arguments with the tool's precompiled schema. Returns (True, args) or (False, error message).'''
+        try:
+            validated=self._tool_method_schema[method_name].model_validate(tool_args)
+        except ValidationError as e:
+            return False, "; ".join(f"{'.'.join(str(p) for p in error['loc']) or '<root>'}: {error['msg']}" for error in e.errors(include_url=False))
+        # Only keep what the caller passed (plus coercions), so defaults stay with the function signature
+        return True, {name: getattr(validated, name) for name in tool_args}
+
+    def get_tool_json_schema(self,method_name:str) -> str:
+        '''Cached, serialised JSON schema of the tool's arguments.'''
+        return self._tool_json_schema[method_name]
+
     def get_tools(self):
         return self._tools
-    
-    def get_tool_info(self):
-        return list(self._tools.items())
-    
+
+    def get_tool_info(self,include_schema:bool=False,names=None):
+        '''(name, description[, schema]) for every tool, or only for the given names.'''
+        items=[(name, self._tools[name]) for name in names if name in self._tools] if names is not None else self._tools.items()
+        if include_schema:
+            return [(name, doc, self._tool_json_schema[name]) for name, doc in items]
+        return list(items)
+
     def get_tool_method_schema(self,method_name:str):
         return self._tool_method_schema[method_name]
-
-        
\ No newline at end of file
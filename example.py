@@ -40,7 +40,7 @@ def web_search(url: str) -> str:
         return f"Opened: {url}"
     except Exception as e:
         return f"Error: {e}"
-@model1_tools.add_tool
+@model1_tools.add_tool(execution="thread", timeout=60)  # speaking blocks, keep it off the event loop
 def text_to_speech(text:str, rate:int=150, volume:float=1.0, voice_index:int=0):
     """
     Convert text to speech using pyttsx3.
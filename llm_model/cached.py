@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReplayMissError(RuntimeError):
+    '''Raised in replay mode when a request has no recorded response.'''
+
+
+class CachedLLM:
+    def __init__(
+        self,
+        llm_client,
+        path: str = "./llm_cache.db",
+        mode: str = "record",
+        max_memory_entries: int = 1024,
+        model_params: dict = None,
+    ):
+        """
+        Record/replay cache that wraps any `invoke_model` client from `llm_model`.
+
+        Responses are keyed on a hash of the normalised message list and the model parameters
+        and stored in a SQLite file, with an in-memory LRU in front of it.
+
+        :param llm_client: The client to wrap (OpenAi, Gemini, HuggingFace, LocalLLM, ...).
+        :param path: SQLite file holding recorded responses.
+        :param mode: "record" serves cached responses and records misses,
+                     "replay" serves cached responses only and raises ReplayMissError on a miss (offline, deterministic runs).
+        :param max_memory_entries: Size of the in-memory LRU index.
+        :param model_params: Extra parameters that change the output (e.g. temperature) and must be part of the key.
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay'")
+        self.llm_client = llm_client
+        self.path = path
+        self.mode = mode
+        self.max_memory_entries = max_memory_entries
+        self.model_params = {
+            "client": type(llm_client).__name__,
+            "model": getattr(llm_client, "model", None) if isinstance(getattr(llm_client, "model", None), str) else getattr(llm_client, "model_name", None),
+            **(model_params or {}),
+        }
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)")
+        self._db.commit()
+
+    def __getattr__(self, name):
+        # Everything except invoke_model (e.g. LocalLLM.list_models) goes straight to the wrapped client
+        if name == "llm_client":
+            raise AttributeError(name)
+        return getattr(self.llm_client, name)
+
+    def cache_key(self, messages: list[dict]) -> str:
+        '''Stable hash of the messages (role + content only, so extra bookkeeping keys don't break hits) and the model parameters.'''
+        normalised = [{"role": msg.get("role"), "content": str(msg.get("content", ""))} for msg in messages]
+        payload = json.dumps({"messages": normalised, "params": self.model_params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, response: str):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key: str, response: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)", (key, response, time.time()))
+            self._db.commit()
+
+    async def invoke_model(self, messages: list[dict]) -> str:
+        """
+        Return the recorded response for these messages, or call the wrapped client and record it.
+
+        :param messages: List of message dicts with "role" and "content" keys.
+        :return: The model's text response as a string.
+        """
+        key = self.cache_key(messages)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+        response = await asyncio.to_thread(self._load, key)
+        if response is not None:
+            self._remember(key, response)
+            self.hits += 1
+            return response
+        self.misses += 1
+        if self.mode == "replay":
+            raise ReplayMissError(f"No recorded LLM response for request {key[:12]} (replay mode).")
+        response = await self.llm_client.invoke_model(messages=messages)
+        if response:
+            await asyncio.to_thread(self._store, key, response)
+            self._remember(key, response)
+        return response
+
+    async def stream_model(self, messages: list[dict]):
+        '''Cached responses are complete strings, so "streaming" yields the whole response at once.'''
+        yield await self.invoke_model(messages=messages)
+
+    def clear(self):
+        '''Delete every recorded response.'''
+        with self._lock:
+            self._db.execute("DELETE FROM llm_cache")
+            self._db.commit()
+        self._memory.clear()
+
+    def close(self):
+        self._db.close()
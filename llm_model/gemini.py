@@ -1,17 +1,106 @@
-import google.generativeai as genai
+import time
+from .http_pool import HttpPool, get_http_pool
+from .prompt_cache import PromptCacheStats, split_stable_prefix, prefix_hash
+from .rate_limit import RateLimitError, RETRYABLE_STATUS, rate_limit_headers, retry_after_from_headers, parse_duration
+from .structured import response_schema, inline_refs, rejects_response_format
 
 class Gemini:
-    def __init__(self, api_key: str, model: str = "gemini-1.5-flash"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-1.5-flash",
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta",
+        http_pool: HttpPool = None,
+        prompt_caching: bool = False,
+        cache_ttl: int = 3600,
+        structured_output: bool = False,
+    ):
         """
         Initialize the Gemini client.
-        
+
+        Calls the Gemini REST API directly over the shared `llm_model.http_pool`,
+        so requests are non-blocking and reuse keep-alive connections.
+
         :param api_key: Your Google AI Studio API key.
         :param model: Gemini model name (default: gemini-1.5-flash).
                       Other options: gemini-1.5-pro, gemini-2.0-flash
+        :param base_url: Generative Language API root (default: v1beta).
+        :param http_pool: Connection pool to use (default: the shared pool).
+        :param prompt_caching: Store the leading system messages as a Gemini `cachedContents`
+                               entry and reference it instead of resending them. Gemini only
+                               caches prompts above a model-specific minimum size; smaller
+                               prefixes are sent normally.
+        :param cache_ttl: Lifetime in seconds of the cached content.
+        :param structured_output: Ask for JSON (`responseMimeType`) that follows the agent's response
+                                  schema (`responseJsonSchema`); if the model rejects the schema,
+                                  only JSON mode is requested from then on.
         """
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
+        self.api_key = api_key
         self.model_name = model
+        self.base_url = base_url.rstrip("/")
+        self.http_pool = http_pool
+        self.prompt_caching = prompt_caching
+        self.cache_ttl = cache_ttl
+        self.cache_stats = PromptCacheStats()
+        self.last_response_headers = {}
+        self._cached_contents = {}  # prefix hash: (cachedContents name or None, valid until)
+        self.structured_output = structured_output
+        self._schema_supported = True
+
+    def _convert(self, messages: list[dict]) -> tuple[str, list[dict]]:
+        """
+        Convert OpenAI-style messages into Gemini's system instruction and contents.
+
+        The leading system messages become the system instruction, unchanged from call to
+        call, so the prompt prefix stays cacheable. System messages later in the conversation
+        (e.g. retrieved memories) are sent as user turns. Consecutive turns of the same role
+        are merged, as Gemini expects alternating "user"/"model" turns.
+        """
+        prefix, rest = split_stable_prefix(messages)
+        system_content = "\n\n".join(msg["content"] for msg in prefix)
+        contents = []
+        for msg in rest:
+            role = "model" if msg["role"] == "assistant" else "user"
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append({"text": msg["content"]})
+            else:
+                contents.append({"role": role, "parts": [{"text": msg["content"]}]})
+        if not contents:
+            # Only system messages: Gemini needs at least one turn
+            return "", [{"role": "user", "parts": [{"text": system_content}]}]
+        return system_content, contents
+
+    async def _get_cached_content(self, system_content: str):
+        """Name of a `cachedContents` entry holding the system instruction, creating it if needed (None if Gemini refuses)."""
+        key = prefix_hash([{"role": "system", "content": system_content}])
+        name, valid_until = self._cached_contents.get(key, (None, 0))
+        if time.time() < valid_until:
+            return name
+        url = f"{self.base_url}/cachedContents"
+        client = (self.http_pool or get_http_pool()).get_client(url)
+        response = await client.post(url, json={
+            "model": f"models/{self.model_name}",
+            "systemInstruction": {"parts": [{"text": system_content}]},
+            "ttl": f"{self.cache_ttl}s",
+        }, headers={"x-goog-api-key": self.api_key})
+        # A refusal (e.g. prefix below the minimum cacheable size) is remembered so it is not retried on every call
+        name = response.json().get("name") if not response.is_error else None
+        self._cached_contents[key] = (name, time.time() + max(self.cache_ttl - 60, 1))
+        return name
+
+    def _retry_delay(self, response) -> float:
+        """Seconds to wait from the Retry-After header or the google.rpc.RetryInfo detail of an error body."""
+        retry_after = retry_after_from_headers(self.last_response_headers)
+        if retry_after is not None:
+            return retry_after
+        try:
+            details = response.json().get("error", {}).get("details", [])
+        except ValueError:
+            return None
+        for detail in details:
+            if isinstance(detail, dict) and detail.get("retryDelay"):
+                return parse_duration(detail["retryDelay"])
+        return None
 
     async def invoke_model(self, messages: list[dict]) -> str:
         """
@@ -20,9 +109,8 @@ class Gemini:
         The messages follow the standard OpenAI format:
             [{"role": "system"|"user"|"assistant", "content": "..."}]
 
-        Gemini uses a different role naming ("user"/"model") and doesn't support
-        a dedicated system role — so we prepend the system prompt to the first
-        user message instead.
+        Gemini uses a different role naming ("user"/"model"); the leading system messages
+        are passed as `systemInstruction` (or as cached content with prompt_caching).
 
         :param messages: List of message dicts with "role" and "content" keys.
         :return: The model's text response as a string.
@@ -30,30 +118,49 @@ class Gemini:
         if not messages:
             raise ValueError("Messages list cannot be empty")
 
-        # Extract system prompt if present
-        system_content = ""
-        chat_messages = []
-        for msg in messages:
-            if msg["role"] == "system":
-                system_content = msg["content"]
-            else:
-                chat_messages.append(msg)
+        system_content, contents = self._convert(messages)
+        body = {"contents": contents}
+        cached_content = await self._get_cached_content(system_content) if self.prompt_caching and system_content else None
+        if cached_content:
+            body["cachedContent"] = cached_content
+        elif system_content:
+            body["systemInstruction"] = {"parts": [{"text": system_content}]}
+        schema = response_schema.get() if self.structured_output else None
+        if schema is not None:
+            body["generationConfig"] = {"responseMimeType": "application/json"}
+            if self._schema_supported:
+                body["generationConfig"]["responseJsonSchema"] = inline_refs(schema)
 
-        # Convert to Gemini's format: roles must be "user" or "model"
-        gemini_history = []
-        for msg in chat_messages[:-1]:  # all but the last message go into history
-            role = "model" if msg["role"] == "assistant" else "user"
-            gemini_history.append({"role": role, "parts": [msg["content"]]})
+        url = f"{self.base_url}/models/{self.model_name}:generateContent"
+        client = (self.http_pool or get_http_pool()).get_client(url)
+        response = await client.post(url, json=body, headers={"x-goog-api-key": self.api_key})
+        if response.is_error and cached_content and response.status_code not in RETRYABLE_STATUS:
+            # The cache entry may have expired or been deleted server side: forget it and send the prefix inline
+            self._cached_contents.clear()
+            body.pop("cachedContent")
+            body["systemInstruction"] = {"parts": [{"text": system_content}]}
+            response = await client.post(url, json=body, headers={"x-goog-api-key": self.api_key})
+        if response.status_code == 400 and "responseJsonSchema" in body.get("generationConfig", {}) and rejects_response_format(response.text):
+            # Models without schema support still take JSON mode; stick to it once that works
+            body["generationConfig"].pop("responseJsonSchema")
+            response = await client.post(url, json=body, headers={"x-goog-api-key": self.api_key})
+            if not response.is_error:
+                self._schema_supported = False
+        self.last_response_headers = rate_limit_headers(response.headers)
+        if response.status_code in RETRYABLE_STATUS:
+            raise RateLimitError(f"Gemini API error {response.status_code}: {response.text}", response.status_code,
+                                 self._retry_delay(response), self.last_response_headers)
+        if response.is_error:
+            raise RuntimeError(f"Gemini API error {response.status_code}: {response.text}")
+        result = response.json()
 
-        # The last message is the current prompt
-        last_message = chat_messages[-1]["content"] if chat_messages else ""
+        usage = result.get("usageMetadata") or {}
+        if usage:
+            self.cache_stats.record(usage.get("promptTokenCount"), usage.get("cachedContentTokenCount"))
 
-        # Prepend system prompt to the first user turn if present
-        if system_content and gemini_history and gemini_history[0]["role"] == "user":
-            gemini_history[0]["parts"][0] = system_content + "\n\n" + gemini_history[0]["parts"][0]
-        elif system_content and not gemini_history:
-            last_message = system_content + "\n\n" + last_message
+        candidates = result.get("candidates") or []
+        if not candidates:
+            raise RuntimeError(f"Unexpected response format: {result}")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
 
-        chat = self.model.start_chat(history=gemini_history)
-        response = chat.send_message(last_message)
-        return response.text
\ No newline at end of file
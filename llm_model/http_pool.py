@@ -0,0 +1,109 @@
+import asyncio
+from urllib.parse import urlsplit
+import httpx
+
+
+class HttpPool:
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 120.0,
+    ):
+        """
+        Shared pool of keep-alive async HTTP clients used by every backend in `llm_model`.
+
+        One `httpx.AsyncClient` is kept per host (and per event loop), so agents talking to
+        the same provider reuse open connections instead of paying a new TCP/TLS handshake
+        on every call, and a slow provider can't starve connections for another one.
+
+        :param max_connections: Default cap on concurrent connections per host.
+        :param max_keepalive_connections: Default number of idle connections kept open per host.
+        :param keepalive_expiry: Seconds an idle connection is kept before it is closed.
+        :param timeout: Default request timeout in seconds.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self._host_limits = {}  # host: httpx.Limits
+        self._clients = {}  # (host, event_loop): httpx.AsyncClient
+
+    def set_host_limits(self, host: str, max_connections: int, max_keepalive_connections: int = None):
+        '''Override the connection limits for a single host, e.g. "api.openai.com" or "localhost:11434".'''
+        self._host_limits[host] = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections if max_keepalive_connections is not None else min(max_connections, self.max_keepalive_connections),
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        # Existing clients are closed and rebuilt with the new limits on next use
+        for key in [key for key in self._clients if key[0] == host]:
+            self._discard(key)
+
+    def get_limits(self, host: str) -> httpx.Limits:
+        return self._host_limits.get(host) or httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        '''Return the pooled client for the host of the given url, creating it on first use.'''
+        host = urlsplit(url).netloc
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        # Connections are bound to the loop that opened them, so every loop gets its own client
+        client = self._clients.get((host, loop))
+        if client is None and loop is not None:
+            # A client created outside any loop has no connections yet and is adopted by the first loop using it
+            client = self._clients.pop((host, None), None)
+            if client is not None:
+                self._clients[(host, loop)] = client
+        if client is not None and not client.is_closed:
+            return client
+        # Clients of loops that have been closed can't be used again
+        for key in [key for key in self._clients if key[1] is not None and key[1].is_closed()]:
+            del self._clients[key]
+        client = httpx.AsyncClient(limits=self.get_limits(host), timeout=self.timeout)
+        self._clients[(host, loop)] = client
+        return client
+
+    def _discard(self, key: tuple):
+        '''Drop a pooled client and close it on the loop that owns its connections.'''
+        client = self._clients.pop(key)
+        client_loop = key[1]
+        if client_loop is None or client_loop.is_closed() or client.is_closed:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if client_loop is running:
+            running.create_task(client.aclose())
+        else:
+            # Runs once that loop gets control again
+            client_loop.call_soon_threadsafe(lambda: client_loop.create_task(client.aclose()))
+
+    async def aclose(self):
+        '''Close every pooled client owned by the running event loop.'''
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._clients if key[1] is loop or key[1] is None]:
+            await self._clients.pop(key).aclose()
+
+
+_default_pool = HttpPool()
+
+
+def get_http_pool() -> HttpPool:
+    '''Return the process-wide pool shared by all LLM clients.'''
+    return _default_pool
+
+
+def configure_http_pool(**kwargs) -> HttpPool:
+    '''Replace the process-wide pool with one built from the given HttpPool arguments.'''
+    global _default_pool
+    _default_pool = HttpPool(**kwargs)
+    return _default_pool
@@ -1,6 +1,5 @@
-import urllib.request
-import urllib.error
-import json
+from .http_pool import HttpPool, get_http_pool
+from .rate_limit import RateLimitError, RETRYABLE_STATUS, rate_limit_headers, retry_after_from_headers
 
 class HuggingFace:
     def __init__(
@@ -9,6 +8,7 @@ class HuggingFace:
         model: str = "mistralai/Mistral-7B-Instruct-v0.3",
         base_url: str = "https://api-inference.huggingface.co/models",
         max_new_tokens: int = 1024,
+        http_pool: HttpPool = None,
     ):
         """
         Initialize the HuggingFace Inference API client.
@@ -17,6 +17,8 @@ class HuggingFace:
         self.model = model
         self.base_url = base_url
         self.max_new_tokens = max_new_tokens
+        self.http_pool = http_pool
+        self.last_response_headers = {}
 
     async def invoke_model(self, messages: list[dict]) -> str:
         """
@@ -28,7 +30,7 @@ class HuggingFace:
         prompt = self._build_prompt(messages)
 
         url = f"{self.base_url}/{self.model}"
-        payload = json.dumps({
+        payload = {
             "inputs": prompt,
             "parameters": {
                 "max_new_tokens": self.max_new_tokens,
@@ -36,24 +38,27 @@ class HuggingFace:
                 "do_sample": True,
                 "temperature": 0.7,
             }
-        }).encode("utf-8")
+        }
 
-        req = urllib.request.Request(
+        client = (self.http_pool or get_http_pool()).get_client(url)
+        response = await client.post(
             url,
-            data=payload,
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            },
-            method="POST",
+            json=payload,
+            headers={"Authorization": f"Bearer {self.api_key}"},
         )
-
-        try:
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode())
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode()
-            raise RuntimeError(f"HuggingFace API error {e.code}: {error_body}")
+        self.last_response_headers = rate_limit_headers(response.headers)
+        if response.status_code in RETRYABLE_STATUS:
+            # A 503 while the model is loading comes with an estimated_time to wait
+            retry_after = retry_after_from_headers(self.last_response_headers)
+            if retry_after is None and response.status_code == 503:
+                try:
+                    retry_after = float(response.json().get("estimated_time"))
+                except (ValueError, TypeError, AttributeError):
+                    retry_after = None
+            raise RateLimitError(f"HuggingFace API error {response.status_code}: {response.text}", response.status_code, retry_after, self.last_response_headers)
+        if response.is_error:
+            raise RuntimeError(f"HuggingFace API error {response.status_code}: {response.text}")
+        result = response.json()
 
         if isinstance(result, list) and result:
             return result[0].get("generated_text", "").strip()
@@ -81,4 +86,4 @@ class HuggingFace:
             elif role == "assistant":
                 prompt += f" {content} "
 
-        return prompt.strip()
\ No newline at end of file
+        return prompt.strip()
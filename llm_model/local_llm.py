@@ -1,12 +1,16 @@
-import urllib.request
-import urllib.error
+import httpx
 import json
+from .http_pool import HttpPool, get_http_pool
+from .rate_limit import RateLimitError, RETRYABLE_STATUS, retry_after_from_headers
+from .structured import response_schema
 
 class LocalLLM:
     def __init__(
         self,
         model: str = "llama3.2",
         base_url: str = "http://localhost:11434",
+        http_pool: HttpPool = None,
+        structured_output: bool = False,
     ):
         """
         Initialize a local LLM client using Ollama.
@@ -23,9 +27,14 @@ class LocalLLM:
                       Run `ollama list` to see what you have pulled.
                       Popular choices: llama3.2, mistral, gemma2, phi3
         :param base_url: Ollama server URL (default: localhost:11434).
+        :param http_pool: Connection pool to use (default: the shared `llm_model.http_pool`).
+        :param structured_output: Pass the agent's response schema as Ollama's `format`, so the
+                                  model can only produce matching JSON (Ollama 0.5+).
         """
         self.model = model
         self.base_url = base_url.rstrip("/")
+        self.http_pool = http_pool
+        self.structured_output = structured_output
 
     async def invoke_model(self, messages: list[dict]) -> str:
         """
@@ -41,23 +50,23 @@ class LocalLLM:
             raise ValueError("Messages list cannot be empty")
 
         url = f"{self.base_url}/api/chat"
-        payload = json.dumps({
+        payload = {
             "model": self.model,
             "messages": messages,
             "stream": False,
-        }).encode("utf-8")
-
-        req = urllib.request.Request(
-            url,
-            data=payload,
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
+        }
+        schema = response_schema.get() if self.structured_output else None
+        if schema is not None:
+            payload["format"] = schema
 
+        client = (self.http_pool or get_http_pool()).get_client(url)
         try:
-            with urllib.request.urlopen(req, timeout=120) as response:
-                result = json.loads(response.read().decode())
-        except urllib.error.URLError as e:
+            response = await client.post(url, json=payload, timeout=120)
+            if response.status_code in RETRYABLE_STATUS:  # Ollama answers 503 when its request queue is full
+                raise RateLimitError(f"Ollama is busy ({response.status_code}): {response.text}", response.status_code, retry_after_from_headers(response.headers))
+            response.raise_for_status()
+            result = response.json()
+        except httpx.HTTPError as e:
             raise RuntimeError(
                 f"Could not connect to Ollama at {self.base_url}. "
                 f"Is Ollama running? Try `ollama serve` in a terminal. Error: {e}"
@@ -65,16 +74,60 @@ class LocalLLM:
 
         return result["message"]["content"].strip()
 
+    async def stream_model(self, messages: list[dict]):
+        """
+        Invoke a local Ollama model and yield the response text chunk by chunk.
+
+        Uses `stream: true`, where Ollama sends one JSON object per line.
+
+        :param messages: List of message dicts with "role" and "content" keys.
+        """
+        if not messages:
+            raise ValueError("Messages list cannot be empty")
+
+        url = f"{self.base_url}/api/chat"
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+        }
+        schema = response_schema.get() if self.structured_output else None
+        if schema is not None:
+            payload["format"] = schema
+
+        client = (self.http_pool or get_http_pool()).get_client(url)
+        try:
+            async with client.stream("POST", url, json=payload, timeout=120) as response:
+                if response.status_code in RETRYABLE_STATUS:
+                    await response.aread()
+                    raise RateLimitError(f"Ollama is busy ({response.status_code}): {response.text}", response.status_code, retry_after_from_headers(response.headers))
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    part = json.loads(line)
+                    content = part.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if part.get("done"):
+                        break
+        except httpx.HTTPError as e:
+            raise RuntimeError(
+                f"Could not connect to Ollama at {self.base_url}. "
+                f"Is Ollama running? Try `ollama serve` in a terminal. Error: {e}"
+            )
+
     async def list_models(self) -> list[str]:
         """
         Returns a list of model names available in the local Ollama instance.
         Useful for checking what's pulled before initializing.
         """
         url = f"{self.base_url}/api/tags"
-        req = urllib.request.Request(url, method="GET")
+        client = (self.http_pool or get_http_pool()).get_client(url)
         try:
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode())
+            response = await client.get(url)
+            response.raise_for_status()
+            result = response.json()
             return [m["name"] for m in result.get("models", [])]
         except Exception as e:
-            raise RuntimeError(f"Could not list Ollama models: {e}")
\ No newline at end of file
+            raise RuntimeError(f"Could not list Ollama models: {e}")
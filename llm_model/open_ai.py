@@ -1,42 +1,102 @@
-from openai import OpenAI
-import asyncio
+from openai import AsyncOpenAI, BadRequestError
+from .http_pool import HttpPool, get_http_pool
+from .prompt_cache import PromptCacheStats, split_stable_prefix, prefix_hash
+from .rate_limit import rate_limit_headers
+from .structured import response_schema, rejects_response_format
 
 class OpenAi:
-    def __init__(self,api_key:str,base_url:str="https://integrate.api.nvidia.com/v1",model:str="openai/gpt-oss-20b"):
-        '''Initializes the OpenAI client with the provided API key.'''
-        client=OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
-        self.client=client
+    def __init__(self,api_key:str,base_url:str="https://integrate.api.nvidia.com/v1",model:str="openai/gpt-oss-20b",http_pool:HttpPool=None,prompt_caching:bool=False,prompt_cache_key:str=None,structured_output:bool=False):
+        '''Initializes the OpenAI client with the provided API key. Connections come from the shared `http_pool`.
+        With prompt_caching=True requests carry a prompt_cache_key (default: hash of the leading system messages) so
+        calls sharing the prefix are routed to the same cache, and ask for usage so cache hits show up in cache_stats.
+        Only enable it for endpoints that accept these parameters.
+        With structured_output=True agent requests carry the AgentResponse schema as a json_schema response_format; an endpoint
+        that rejects it is asked for plain JSON mode (json_object) instead, and after that for no response_format at all.'''
+        self.api_key=api_key
+        self.base_url=base_url
         self.model=model
-    
-    async def invoke_model(self,messages:list=[{"role":"user","content":""}])->str:
-        '''Invokes the OpenAI model with the given prompt and returns the response.'''
-        if not self.client:
+        self.http_pool=http_pool
+        self.prompt_caching=prompt_caching
+        self.prompt_cache_key=prompt_cache_key
+        self.cache_stats=PromptCacheStats()
+        self.last_response_headers={}
+        self.structured_output=structured_output
+        self._response_formats=["json_schema","json_object"]  # what this endpoint accepts, best first
+        self.client=None
+        self._http_client=None
+
+    def _get_client(self)->AsyncOpenAI:
+        '''Returns an async client bound to the pooled connection for this base_url, rebuilding it if the pool handed out a new one.'''
+        http_client=(self.http_pool or get_http_pool()).get_client(self.base_url)
+        if self.client is None or self._http_client is not http_client:
+            self.client=AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=http_client
+            )
+            self._http_client=http_client
+        return self.client
+
+    async def stream_model(self,messages:list=[{"role":"user","content":""}]):
+        '''Invokes the OpenAI model and yields the response text chunk by chunk as it is streamed.'''
+        client=self._get_client()
+        if not client:
             raise Exception("Client not initialized")
-        completion = self.client.chat.completions.create(
-        model=self.model,
-        messages=messages,
-        temperature=1,
-        top_p=1,
-        max_tokens=4096,
-        stream=True
-        )
-        full_response = ""
-        for chunk in completion:
+        cache_options={}
+        if self.prompt_caching:
+            cache_options["stream_options"]={"include_usage": True}
+            cache_options["prompt_cache_key"]=self.prompt_cache_key or prefix_hash(split_stable_prefix(messages)[0])[:32]
+        schema=response_schema.get() if self.structured_output else None
+        formats=list(self._response_formats) if schema is not None else []
+        while True:
+            format_options={}
+            if formats:
+                format_options["response_format"]=self._response_format(formats[0],schema)
+            try:
+                # The raw response exposes the x-ratelimit-* headers a RequestScheduler adapts to
+                response = await client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=messages,
+                temperature=1,
+                top_p=1,
+                max_tokens=4096,
+                stream=True,
+                **cache_options,
+                **format_options
+                )
+                break
+            except BadRequestError as e:
+                # Only a rejected response_format means the endpoint may not support it; any other 400 is the caller's problem
+                if not format_options or not rejects_response_format(f"{e} {e.body}"):
+                    raise
+                # Step down, and remember it once a lower one works
+                formats.pop(0)
+        if schema is not None and formats!=self._response_formats:
+            self._response_formats=formats
+        self.last_response_headers=rate_limit_headers(response.headers)
+        completion=response.parse()
+        async for chunk in completion:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                details = getattr(usage, "prompt_tokens_details", None)
+                self.cache_stats.record(usage.prompt_tokens, getattr(details, "cached_tokens", 0) if details else 0)
             if not getattr(chunk, "choices", None):
                 continue
             reasoning = getattr(chunk.choices[0].delta, "reasoning_content", None)
             if reasoning:pass
                 # print(reasoning, end="")
             if chunk.choices and chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
-                # print(content, end="")
-                full_response += content
+                yield chunk.choices[0].delta.content
+
+    def _response_format(self,kind:str,schema:dict)->dict:
+        if kind=="json_schema":
+            # strict mode would require every field, but AgentResponse fields are optional
+            return {"type":"json_schema","json_schema":{"name":"agent_response","schema":schema,"strict":False}}
+        return {"type":"json_object"}
+
+    async def invoke_model(self,messages:list=[{"role":"user","content":""}])->str:
+        '''Invokes the OpenAI model with the given prompt and returns the response.'''
+        full_response = ""
+        async for content in self.stream_model(messages):
+            full_response += content
         return full_response
-                
-        
-                
-                
-            
@@ -0,0 +1,59 @@
+import hashlib
+import json
+
+
+def split_stable_prefix(messages: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Split messages into the leading run of system messages and the rest.
+
+    Agents keep their system prompt, tool catalog and instructions at the start of the
+    conversation and never change them, so this prefix is byte-identical from call to call
+    and is what provider prompt caches can reuse.
+    """
+    head = 0
+    while head < len(messages) and messages[head].get("role") == "system":
+        head += 1
+    return messages[:head], messages[head:]
+
+
+def prefix_hash(prefix: list[dict]) -> str:
+    """Stable hash of a message prefix, used as cache key."""
+    return hashlib.sha256(json.dumps(prefix, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class PromptCacheStats:
+    def __init__(self):
+        """
+        Per-client prompt cache counters, filled from the usage the provider reports.
+
+        A call counts as a hit when any prompt tokens were served from the cache.
+        `last` holds the numbers of the most recent call.
+        """
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.last = None
+
+    def record(self, prompt_tokens: int, cached_tokens: int) -> dict:
+        prompt_tokens, cached_tokens = prompt_tokens or 0, cached_tokens or 0
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        if cached_tokens:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.last = {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "cache_hit": cached_tokens > 0}
+        return self.last
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "last": self.last,
+        }
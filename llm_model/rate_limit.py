@@ -0,0 +1,376 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import re
+import time
+from contextlib import contextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Priority of the LLM requests made from the current task; lower values are served first.
+# Tasks inherit it from the code that created them, so setting it at the top of a job covers every call the job makes.
+request_priority = contextvars.ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+# Rate limited (429) and overloaded (503, 529) responses are worth retrying after a pause
+RETRYABLE_STATUS = (429, 503, 529)
+
+
+class RateLimitError(RuntimeError):
+    def __init__(self, message: str, status_code: int = 429, retry_after: float = None, headers: dict = None):
+        '''Raised by the llm_model clients when the provider rejects a request for rate or capacity reasons.'''
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.headers = headers or {}
+
+
+@contextmanager
+def priority(level: int):
+    '''Run the enclosed LLM requests at the given priority, e.g. `with priority(PRIORITY_BATCH): ...`.'''
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+def parse_duration(value) -> float:
+    '''Seconds from a header value: plain seconds ("1.5") or a duration like "6m0s", "20ms", "1h2m".'''
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def retry_after_from_headers(headers) -> float:
+    if not headers:
+        return None
+    if headers.get("retry-after-ms") is not None:
+        return parse_duration(headers["retry-after-ms"]) / 1000
+    return parse_duration(headers.get("retry-after"))
+
+
+def rate_limit_headers(headers) -> dict:
+    '''The retry-after and x-ratelimit-* headers of a response, lower-cased.'''
+    if not headers:
+        return {}
+    return {key.lower(): value for key, value in headers.items()
+            if key.lower().startswith(("x-ratelimit-", "retry-after"))}
+
+
+def _retryable(exc: Exception):
+    '''(retry_after, headers) when the error is a rate limit / overload the scheduler should retry, else None.
+    Works for RateLimitError and for SDK errors carrying status_code and response (e.g. openai.RateLimitError).'''
+    if isinstance(exc, RateLimitError):
+        return exc.retry_after, exc.headers
+    if getattr(exc, "status_code", None) in RETRYABLE_STATUS:
+        headers = rate_limit_headers(getattr(getattr(exc, "response", None), "headers", None))
+        return retry_after_from_headers(headers), headers
+    return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        '''Continuously refilling bucket holding up to per_minute units, refilled at per_minute / 60 per second.'''
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        '''Seconds until amount units are available (a request larger than the bucket waits for a full bucket).'''
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60 / self.capacity)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def set_limit(self, per_minute: float):
+        self._refill()
+        self.level = min(self.level, float(per_minute))
+        self.capacity = float(per_minute)
+
+    def set_remaining(self, remaining: float):
+        self._refill()
+        self.level = min(self.level, float(remaining))
+
+
+class _Lane:
+    '''Limits and waiting requests of one provider/model.'''
+
+    def __init__(self, key: str, rpm: float = None, tpm: float = None):
+        self.key = key
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.queue = []  # heap of (priority, sequence, tokens, future)
+        self.wakeup = None
+        self.pump = None
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "waited_seconds": 0.0}
+
+    def wait_time(self, tokens: float) -> float:
+        wait = max(0.0, self.paused_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def consume(self, tokens: float):
+        if self.requests:
+            self.requests.consume(1)
+        if self.tokens:
+            self.tokens.consume(tokens)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.notify()
+
+    def notify(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def update_from_headers(self, headers: dict):
+        '''Adopt the limits the provider reports (OpenAI-style x-ratelimit-{limit,remaining,reset}-{requests,tokens}).'''
+        for kind in ("requests", "tokens"):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                limit = float(limit) if limit is not None else None
+                remaining = float(remaining) if remaining is not None else None
+            except ValueError:
+                continue
+            bucket = getattr(self, kind)
+            if limit:
+                if bucket is None:
+                    bucket = TokenBucket(limit)
+                    setattr(self, kind, bucket)
+                else:
+                    bucket.set_limit(limit)
+            if remaining is not None and bucket is not None:
+                bucket.set_remaining(remaining)
+                if remaining < 1:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self.pause(reset)
+        self.notify()
+
+
+class RequestScheduler:
+    def __init__(self, limits: dict = None, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Shared scheduler in front of LLM requests: token-bucket limits per provider/model, priority queues and retries.
+
+        Requests of one lane (provider/model) are started in priority order (lower `request_priority` first, FIFO within
+        a priority) as soon as the requests-per-minute and tokens-per-minute buckets allow. Limits adapt to the provider's
+        x-ratelimit-* headers, and rate limited or overloaded responses are retried after the provider's retry-after or an
+        exponential backoff with full jitter.
+
+        :param limits: {"<Client>:<model>" or "<Client>": {"rpm": ..., "tpm": ...}}; lanes without an entry start unlimited
+                       until the provider reports its limits.
+        :param max_retries: Retries per request after rate limit / overload errors.
+        :param base_delay: First backoff step in seconds when the provider gives no retry-after.
+        :param max_delay: Upper bound of a backoff step in seconds.
+        """
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lanes = {}
+        self._sequence = itertools.count()
+
+    def lane(self, key: str) -> _Lane:
+        lane = self._lanes.get(key)
+        if lane is None:
+            limits = self.limits.get(key) or self.limits.get(key.split(":", 1)[0]) or {}
+            lane = self._lanes[key] = _Lane(key, limits.get("rpm"), limits.get("tpm"))
+        return lane
+
+    def set_limits(self, key: str, rpm: float = None, tpm: float = None):
+        '''Set the limits of a lane ("<Client>:<model>"); None leaves that limit unchanged.'''
+        self.limits[key] = {**self.limits.get(key, {}), **{k: v for k, v in (("rpm", rpm), ("tpm", tpm)) if v is not None}}
+        lane = self.lane(key)
+        lane.update_from_headers({"x-ratelimit-limit-requests": rpm, "x-ratelimit-limit-tokens": tpm})
+
+    def update_from_headers(self, key: str, headers: dict):
+        if headers:
+            self.lane(key).update_from_headers(headers)
+
+    def stats(self) -> dict:
+        return {key: {**lane.stats, "queued": len(lane.queue)} for key, lane in self._lanes.items()}
+
+    async def acquire(self, key: str, tokens: float = 0, priority: int = None):
+        '''Wait until the lane lets a request of about `tokens` tokens start.'''
+        lane = self.lane(key)
+        if priority is None:
+            priority = request_priority.get()
+        if not lane.queue and lane.wait_time(tokens) == 0:
+            lane.consume(tokens)
+            lane.stats["requests"] += 1
+            return
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.queue, (priority, next(self._sequence), tokens, future))
+        if lane.pump is None or lane.pump.done() or lane.pump.get_loop() is not asyncio.get_running_loop():
+            lane.wakeup = asyncio.Event()
+            lane.pump = asyncio.create_task(self._pump(lane))
+        else:
+            lane.notify()
+        await future
+        lane.stats["requests"] += 1
+        lane.stats["waited_seconds"] += time.monotonic() - started
+
+    async def _pump(self, lane: _Lane):
+        '''Start the best waiting request whenever the lane's limits allow it.'''
+        while lane.queue:
+            _, _, tokens, future = lane.queue[0]
+            if future.done():  # cancelled while waiting
+                heapq.heappop(lane.queue)
+                continue
+            wait = lane.wait_time(tokens)
+            if wait > 0:
+                # A new request, a header update or a pause can change who goes next, so wake up for those too
+                lane.wakeup.clear()
+                try:
+                    await asyncio.wait_for(lane.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(lane.queue)
+            lane.consume(tokens)
+            future.set_result(None)
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(self, key: str, call, tokens: float = 0, priority: int = None, on_headers=None):
+        '''Await call() once the lane allows it, retrying rate limit / overload errors.
+        on_headers() may return the rate limit headers of the last response to adapt the lane.'''
+        lane = self.lane(key)
+        attempt = 0
+        while True:
+            await self.acquire(key, tokens, priority)
+            try:
+                result = await call()
+            except Exception as e:
+                info = _retryable(e)
+                if info is None:
+                    raise
+                retry_after, headers = info
+                lane.stats["rate_limited"] += 1
+                self.update_from_headers(key, headers)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, retry_after)
+                # The whole lane waits, not only this request, so queued requests don't hit the same limit
+                lane.pause(retry_after if retry_after is not None else delay)
+                lane.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            if on_headers is not None:
+                self.update_from_headers(key, on_headers())
+            return result
+
+
+def estimate_request_tokens(messages: list[dict], max_output_tokens: int = 1024) -> int:
+    '''Rough token cost of a request for the tokens-per-minute bucket (~4 characters per token plus the output budget).'''
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + max_output_tokens
+
+
+class RateLimitedLLM:
+    def __init__(self, llm_client, scheduler: RequestScheduler = None, key: str = None, max_output_tokens: int = 1024, priority: int = None):
+        """
+        Routes any `invoke_model` client from `llm_model` through a RequestScheduler.
+
+        :param llm_client: The client to wrap (OpenAi, Gemini, HuggingFace, LocalLLM, CachedLLM, ...).
+        :param scheduler: Scheduler to use; defaults to the process-wide one, so every wrapped client shares its lanes.
+        :param key: Lane of this client; defaults to "<Client>:<model>".
+        :param max_output_tokens: Output budget added to the prompt estimate for the tokens-per-minute bucket.
+        :param priority: Fixed priority for this client; None uses `request_priority` of the calling task.
+        """
+        self.llm_client = llm_client
+        self.scheduler = scheduler
+        model = getattr(llm_client, "model", None)
+        self.key = key or f"{type(llm_client).__name__}:{model if isinstance(model, str) else getattr(llm_client, 'model_name', '')}"
+        self.max_output_tokens = max_output_tokens
+        self.priority = priority
+
+    def __getattr__(self, name):
+        # Everything except invoke_model / stream_model goes straight to the wrapped client
+        if name == "llm_client":
+            raise AttributeError(name)
+        return getattr(self.llm_client, name)
+
+    def _scheduler(self) -> RequestScheduler:
+        return self.scheduler or get_request_scheduler()
+
+    def _headers(self) -> dict:
+        return getattr(self.llm_client, "last_response_headers", None)
+
+    async def invoke_model(self, messages: list[dict]) -> str:
+        """
+        Invoke the wrapped client once the scheduler lets the request start.
+
+        :param messages: List of message dicts with "role" and "content" keys.
+        :return: The model's text response as a string.
+        """
+        return await self._scheduler().run(self.key, lambda: self.llm_client.invoke_model(messages=messages),
+                                           estimate_request_tokens(messages, self.max_output_tokens), self.priority, self._headers)
+
+    async def stream_model(self, messages: list[dict]):
+        '''Streams through the scheduler; a request is only retried while nothing has been yielded yet.'''
+        if not hasattr(self.llm_client, "stream_model"):
+            yield await self.invoke_model(messages)
+            return
+        scheduler = self._scheduler()
+        tokens = estimate_request_tokens(messages, self.max_output_tokens)
+
+        async def first_chunk():
+            stream = self.llm_client.stream_model(messages)
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        stream, chunk = await scheduler.run(self.key, first_chunk, tokens, self.priority)
+        if chunk is None:
+            return
+        yield chunk
+        async for chunk in stream:
+            yield chunk
+        scheduler.update_from_headers(self.key, self._headers())
+
+
+_default_scheduler = RequestScheduler()
+
+
+def get_request_scheduler() -> RequestScheduler:
+    '''Return the process-wide scheduler shared by all RateLimitedLLM clients.'''
+    return _default_scheduler
+
+
+def configure_request_scheduler(**kwargs) -> RequestScheduler:
+    '''Replace the process-wide scheduler with one built from the given RequestScheduler arguments.'''
+    global _default_scheduler
+    _default_scheduler = RequestScheduler(**kwargs)
+    return _default_scheduler
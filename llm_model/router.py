@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import time
+
+# Kind of agent step the current LLM request is for, set by the agent loop:
+# "query" (first call of a run), "tool_result", "continue" (nudge after an unfinished answer),
+# "parse_retry" (asking to fix an invalid response) or "summary" (tool output summarisation).
+step_kind = contextvars.ContextVar("llm_step_kind", default=None)
+
+# Steps that only need the model to repeat or reformat its own work
+CHEAP_STEPS = ("continue", "parse_retry", "summary")
+
+
+class AllBackendsFailedError(RuntimeError):
+    '''Raised by ModelRouter when every backend it tried failed or timed out.'''
+
+
+def _as_list(clients) -> list:
+    if clients is None:
+        return []
+    return list(clients) if isinstance(clients, (list, tuple)) else [clients]
+
+
+def _backend_name(client) -> str:
+    model = getattr(client, "model", None)
+    return f"{type(client).__name__}:{model if isinstance(model, str) else getattr(client, 'model_name', '')}"
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        strong,
+        fast=None,
+        cheap_steps: tuple = CHEAP_STEPS,
+        timeout: float = 120.0,
+        hedge_after: float = None,
+        failure_cooldown: float = 30.0,
+        classify=None,
+    ):
+        """
+        `invoke_model` client that routes each request to a tier of backends, with failover and hedging.
+
+        Cheap agent steps (see `step_kind`) go to the `fast` backends, e.g. a local Ollama model through LocalLLM,
+        and fall back to the `strong` ones; everything else goes to the `strong` backends. Within the chosen list a
+        backend that errors, times out or returns nothing hands over to the next one, and a backend that failed is
+        skipped for failure_cooldown seconds while others are available.
+
+        :param strong: Client or list of clients for queries, tool results and final answers, in order of preference.
+        :param fast: Client or list of clients for cheap steps.
+        :param cheap_steps: Step kinds sent to the fast tier.
+        :param timeout: Seconds before a backend's request counts as failed.
+        :param hedge_after: If set, a request still running after this many seconds is also sent to the next
+                            backend and the first good answer wins; the other request is cancelled.
+        :param failure_cooldown: Seconds a failed backend is skipped.
+        :param classify: Optional classify(messages) -> "fast" | "strong" replacing the step based routing.
+        """
+        self.strong = _as_list(strong)
+        self.fast = _as_list(fast)
+        if not self.strong:
+            raise ValueError("ModelRouter needs at least one strong backend")
+        self.cheap_steps = cheap_steps
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.failure_cooldown = failure_cooldown
+        self.classify = classify
+        self._failed_until = {}  # id(client): time
+        self._stats = {}
+
+    def route(self, messages: list[dict]) -> str:
+        '''"fast" or "strong" for this request.'''
+        if self.classify is not None:
+            return self.classify(messages)
+        return "fast" if self.fast and step_kind.get() in self.cheap_steps else "strong"
+
+    def candidates(self, messages: list[dict]) -> list:
+        '''Backends to try for this request, healthy ones first.'''
+        backends = self.fast + self.strong if self.route(messages) == "fast" else list(self.strong)
+        now = time.monotonic()
+        healthy = [client for client in backends if self._failed_until.get(id(client), 0) <= now]
+        return healthy + [client for client in backends if client not in healthy]
+
+    def stats(self) -> dict:
+        return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def _count(self, client, event: str):
+        counts = self._stats.setdefault(_backend_name(client), {"calls": 0, "wins": 0, "failures": 0, "hedges": 0})
+        counts[event] += 1
+
+    async def _cascade(self, backends: list, call):
+        '''Run call(backend) down the list until one succeeds, hedging slow backends when configured.'''
+        remaining = iter(backends)
+        pending = {}  # task: backend
+        errors = []
+
+        async def attempt(backend):
+            return await asyncio.wait_for(call(backend), self.timeout)
+
+        def launch(hedge: bool = False) -> bool:
+            backend = next(remaining, None)
+            if backend is None:
+                return False
+            self._count(backend, "hedges" if hedge else "calls")
+            pending[asyncio.create_task(attempt(backend))] = backend
+            return True
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(hedge=True)
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    error = task.exception()
+                    if error is None and task.result():
+                        self._count(backend, "wins")
+                        self._failed_until.pop(id(backend), None)
+                        return task.result()
+                    self._count(backend, "failures")
+                    self._failed_until[id(backend)] = time.monotonic() + self.failure_cooldown
+                    errors.append(f"{_backend_name(backend)}: {'timed out' if isinstance(error, asyncio.TimeoutError) else error or 'empty response'}")
+                    launch()
+            raise AllBackendsFailedError(f"All LLM backends failed: {'; '.join(errors)}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def invoke_model(self, messages: list[dict]) -> str:
+        """
+        Invoke the backends chosen for this request until one answers.
+
+        :param messages: List of message dicts with "role" and "content" keys.
+        :return: The model's text response as a string.
+        """
+        return await self._cascade(self.candidates(messages), lambda client: client.invoke_model(messages=messages))
+
+    async def stream_model(self, messages: list[dict]):
+        '''Streams from the first backend to produce a chunk; failover and hedging apply until then.'''
+        async def first_chunk(client):
+            if not hasattr(client, "stream_model"):
+                return None, await client.invoke_model(messages=messages)
+            stream = client.stream_model(messages)
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        stream, chunk = await self._cascade(self.candidates(messages), first_chunk)
+        yield chunk
+        if stream is not None:
+            async for chunk in stream:
+                yield chunk
@@ -0,0 +1,41 @@
+import contextvars
+
+# JSON schema the current LLM request's answer must follow, set by the agent loop from AgentResponse.
+# Clients created with structured_output=True pass it to the provider so the reply is valid JSON by construction.
+response_schema = contextvars.ContextVar("llm_response_schema", default=None)
+
+# Words a provider's 400 error contains when it is the requested output format it rejects
+_FORMAT_ERROR_MARKERS = ("response_format", "json_schema", "json_object", "responsejsonschema", "response_json_schema")
+
+
+def rejects_response_format(error_text: str) -> bool:
+    '''True if a bad request error is about the structured output format, rather than e.g. the prompt length or the messages.'''
+    error_text = (error_text or "").lower()
+    return any(marker in error_text for marker in _FORMAT_ERROR_MARKERS)
+
+
+# Keywords that only document a schema; some providers reject them
+_ANNOTATIONS = ("title", "example", "examples")
+
+
+def inline_refs(schema: dict, strip_annotations: bool = True) -> dict:
+    '''Copy of a JSON schema with every local "$ref" replaced by its "$defs" entry, for providers that do not resolve references.'''
+    definitions = schema.get("$defs", {})
+
+    def resolve(node):
+        if isinstance(node, list):
+            return [resolve(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node and node["$ref"].startswith("#/$defs/"):
+            target = definitions.get(node["$ref"].split("/")[-1], {})
+            return resolve({**target, **{key: value for key, value in node.items() if key != "$ref"}})
+        resolved = {}
+        for key, value in node.items():
+            if key == "$defs" or (strip_annotations and key in _ANNOTATIONS):
+                continue
+            # Under "properties" the keys are field names, which may well be "title"
+            resolved[key] = {name: resolve(field) for name, field in value.items()} if key == "properties" else resolve(value)
+        return resolved
+
+    return resolve(schema)
@@ -0,0 +1,20 @@
+from agent_core.utils.process_response import repair_json
+
+
+def test_repairs_trailing_commas_and_python_literals():
+    assert repair_json("{'text': 'hi', 'tool_call': False, 'task_complete': True,}") == {"text": "hi", "tool_call": False, "task_complete": True}
+
+
+def test_closes_object_cut_off_between_members():
+    data = repair_json('{"text": "done", "tool_call": false, "task_complete": false, "x": ')
+    assert data == {"text": "done", "tool_call": False, "task_complete": False}
+
+
+def test_rejects_truncated_final_answer():
+    assert repair_json('{"tool_call": false, "task_complete": true, "text": "The total refund owed is $1,2') is None
+
+
+def test_rejects_malformed_complete_tool_call():
+    # Missing comma inside tool_args: cutting back to an earlier member would call the tool without its arguments
+    response = '{"tool_call": true, "tool_name": "delete_file", "tool_args": {"path": "a" "force": true}}'
+    assert repair_json(response) is None